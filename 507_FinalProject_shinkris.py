@@ -5,43 +5,440 @@
 
 from bs4 import BeautifulSoup
 import requests
+import argparse
+import asyncio
+import atexit
+import bisect
+import contextlib
+import csv
+import hashlib
+import html
+import http.server
 import json
+import mmap
+import os
+import platform
+import queue
 import re
+import shutil
 import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import urllib.parse
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+import numpy as np
 import plotly.graph_objs as go
+import plotly.io.json
+import plotly.offline
+
+##################################################
+###STAGE TIMERS AND COUNTERS FOR --profile########
+##################################################
+
+class _StageTimer:
+    '''Times one run of a stage for Profiler.stage()'''
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    '''Collects how long each stage took (network, parsing, cache, SQLite, Plotly) and how often things happened
+
+    Disabled by default. While disabled, stage() hands back one shared do-nothing context manager and
+    count() returns straight away, so the instrumentation left in the code costs an attribute check per call.
+
+    Instance Attributes
+    --------------
+    enabled: bool
+    Whether timings and counters are being collected
+
+    stages: dict
+    stage name -> [calls, total seconds, longest seconds]
+
+    counters: dict
+    counter name -> running total
+
+    trace: list
+    One Chrome trace event per timed stage when tracing, else None
+    '''
+
+    _DISABLED = contextlib.nullcontext()
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self.counters = {}
+        self.trace = None
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def enable(self, trace=False):
+        '''Start collecting. With trace=True every timed stage is also kept as an event for write_trace().'''
+        self.enabled = True
+        self._origin = time.perf_counter()
+        if trace:
+            self.trace = []
+
+    def stage(self, name):
+        '''Context manager timing the code inside it under name'''
+        if not self.enabled:
+            return self._DISABLED
+        return _StageTimer(self, name)
+
+    def count(self, name, amount=1):
+        '''Add amount to the counter name'''
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name, start, seconds):
+        with self._lock:
+            totals = self.stages.setdefault(name, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+            if self.trace is not None:
+                self.trace.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                    "ts": round((start - self._origin) * 1e6, 1), "dur": round(seconds * 1e6, 1)})
+
+    def print_summary(self, stream=None):
+        '''Print a table of every stage (slowest total first) and every counter'''
+        stream = stream or sys.stderr
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: item[1][1], reverse=True)
+            counters = sorted(self.counters.items())
+        print("\n" + format("stage", "<24") + format("calls", ">8") + format("total s", ">11") + format("mean ms", ">11") + format("max ms", ">11"), file=stream)
+        for name, (calls, total, longest) in stages:
+            print(format(name, "<24") + format(calls, ">8") + format(total, ">11.3f") + format(total / calls * 1000, ">11.2f") + format(longest * 1000, ">11.2f"), file=stream)
+        for name, amount in counters:
+            print(format(name, "<24") + format(amount, ">8"), file=stream)
+
+    def write_trace(self, filename):
+        '''Write the collected events and counters as a Chrome trace (open it in chrome://tracing or Perfetto)'''
+        with self._lock:
+            events = list(self.trace or [])
+            counters = dict(self.counters)
+        with open(filename, "w") as trace_file:
+            json.dump({"traceEvents": events, "otherData": {"counters": counters}}, trace_file)
+
+PROFILER = Profiler()
 
 ###########################################################################
 ###CACHE DICTIONARY, FILENAME, AND FUNCTIONS FOR CACHING POKEDEX ENTRIES###
 ###########################################################################
 
+#legacy whole-file JSON cache, migrated into the indexed cache store the first time it is opened
 CACHE_FILENAME = "pokedex_cache.json"
+CACHE_DB_FILENAME = "pokedex_cache.sqlite"
+#number of entries kept in memory in front of the cache store
+CACHE_LRU_SIZE = 256
+#seconds before a cached entry counts as expired. None keeps entries forever.
+CACHE_TTL_SECONDS = None
+#why a Pokemon page was recorded as missing from Sword and Shield, and how many seconds that answer is trusted
+ABSENT_NOT_FOUND = "404"
+ABSENT_PARSE_ERROR = "parse error"
+ABSENT_TTL_SECONDS = {ABSENT_NOT_FOUND: 30 * 24 * 60 * 60, ABSENT_PARSE_ERROR: 7 * 24 * 60 * 60}
 CACHE_DICT = {}
 
-def open_cache():
-    ''' Opens the cache file if it exists and loads the JSON into
-    the CACHE_DICT dictionary.
-    if the cache file doesn't exist, creates a new cache dictionary
+class PokemonNotInGame(LookupError):
+    '''Raised when a Pokemon page is missing (404) or can't be parsed, i.e. the Pokemon isn't in that url's game
+
+    Instance Attributes
+    --------------
+    url: string
+    The Serebii page that was checked
+
+    reason: string
+    ABSENT_NOT_FOUND or ABSENT_PARSE_ERROR
+
+    checked_at: float
+    Timestamp of when the page was last checked
+    '''
+
+    def __init__(self, url, reason, checked_at, detail=None):
+        super().__init__(url + " is not in " + (GAMES[game_of_url(url)].title if game_of_url(url) else "its game") + " (" + reason + ")")
+        self.url = url
+        self.reason = reason
+        self.checked_at = checked_at
+        self.detail = detail
+
+
+class CacheStore(MutableMapping):
+    '''Dictionary-like cache of scraped entries backed by a keyed SQLite table
+
+    Reads and writes touch a single row, so looking up or adding one Pokemon no longer
+    reads or rewrites the whole cache. Every write is its own transaction, so a crash
+    mid-write leaves the previous contents intact.
+
+    Instance Attributes
+    --------------
+    filename: string
+    Path of the SQLite file holding the cache
+
+    lru_size: integer
+    Maximum number of entries kept in memory
+
+    ttl: float
+    Seconds an entry stays fresh after it was fetched. None means forever.
+    Expired entries behave as if they were missing.
+
+    Pages known not to hold a Pokemon are kept apart in the Absent table (see mark_absent),
+    so they aren't fetched again until their ABSENT_TTL_SECONDS runs out. The Validators table keeps
+    what run_refresh() needs to revalidate an entry cheaply (ETag, Last-Modified, section hash, last check).
+    '''
+
+    def __init__(self, filename=CACHE_DB_FILENAME, lru_size=CACHE_LRU_SIZE, ttl=CACHE_TTL_SECONDS):
+        self.filename = filename
+        self.lru_size = lru_size
+        self.ttl = ttl
+        self._lru = OrderedDict()
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS Cache(
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS Validators(
+                key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                section_hash TEXT,
+                checked_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS Absent(
+                key TEXT PRIMARY KEY,
+                reason TEXT NOT NULL,
+                detail TEXT,
+                checked_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    #keeps the in-memory layer bounded, dropping the least recently used entry first
+    def _remember(self, key, value, fetched_at):
+        self._lru[key] = (value, fetched_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _is_expired(self, fetched_at):
+        return self.ttl is not None and time.time() - fetched_at > self.ttl
+
+    #returns (value, fetched_at) for a key, or None if it isn't stored
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key]
+            with PROFILER.stage("cache read"):
+                row = self.conn.execute("SELECT value, fetched_at FROM Cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._remember(key, row[0], row[1])
+            return row
+
+    def __getitem__(self, key):
+        entry = self._lookup(key)
+        if entry is None or self._is_expired(entry[1]):
+            raise KeyError(key)
+        return entry[0]
+
+    def __contains__(self, key):
+        entry = self._lookup(key)
+        return entry is not None and not self._is_expired(entry[1])
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def __delitem__(self, key):
+        with self._lock, self.conn:
+            deleted = self.conn.execute("DELETE FROM Cache WHERE key = ?", (key,)).rowcount
+            self._lru.pop(key, None)
+        if not deleted:
+            raise KeyError(key)
+
+    def __iter__(self):
+        with self._lock:
+            keys = [row[0] for row in self.conn.execute("SELECT key FROM Cache")]
+        return iter(keys)
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM Cache").fetchone()[0]
+
+    def update(self, entries=(), fetched_at=None):
+        '''Store many entries in a single transaction
+
+        Parameters
+        ----------
+        entries: dict or iterable of (key, value) pairs
+            The entries to store
+        fetched_at: float
+            Timestamp recorded for every entry. Defaults to now.
+
+        Returns
+        -------
+        None
+        '''
+        if isinstance(entries, Mapping):
+            entries = entries.items()
+        if fetched_at is None:
+            fetched_at = time.time()
+        rows = [(key, value, fetched_at) for (key, value) in entries]
+        PROFILER.count("cache rows written", len(rows))
+        with self._lock, PROFILER.stage("cache write"), self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO Cache (key, value, fetched_at) VALUES (?, ?, ?)", rows)
+            #a page that now holds a Pokemon is no longer missing
+            self.conn.executemany("DELETE FROM Absent WHERE key = ?", [(key,) for (key, value, stamp) in rows])
+            for key, value, stamp in rows:
+                self._remember(key, value, stamp)
+
+    def items(self):
+        '''All unexpired (key, value) pairs, read with one query'''
+        return [(key, value) for (key, value, fetched_at) in self.entries() if not self._is_expired(fetched_at)]
+
+    def entries(self):
+        '''All stored (key, value, fetched_at) rows, expired ones included'''
+        with self._lock:
+            return self.conn.execute("SELECT key, value, fetched_at FROM Cache").fetchall()
+
+    def fetched_at(self, key):
+        '''Timestamp of when key was stored, or None if it isn't cached'''
+        entry = self._lookup(key)
+        if entry is None:
+            return None
+        return entry[1]
+
+    def mark_absent(self, key, reason, detail=None, checked_at=None):
+        '''Record that key was checked and holds no Pokemon, for ABSENT_TTL_SECONDS[reason] seconds
+
+        Parameters
+        ----------
+        key: string
+            The page url
+        reason: string
+            ABSENT_NOT_FOUND or ABSENT_PARSE_ERROR
+        detail: string
+            The error message, kept for reference
+        checked_at: float
+            When the page was checked. Defaults to now.
+
+        Returns
+        -------
+        PokemonNotInGame
+            the error describing the recorded entry, ready to raise
+        '''
+        if checked_at is None:
+            checked_at = time.time()
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO Absent (key, reason, detail, checked_at) VALUES (?, ?, ?, ?)", (key, reason, detail, checked_at))
+        return PokemonNotInGame(key, reason, checked_at, detail)
+
+    def absent(self, key):
+        '''The PokemonNotInGame recorded for key, or None if key isn't known to be missing (or that answer expired)'''
+        with self._lock:
+            row = self.conn.execute("SELECT reason, detail, checked_at FROM Absent WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        reason, detail, checked_at = row
+        ttl = ABSENT_TTL_SECONDS.get(reason)
+        if ttl is not None and time.time() - checked_at > ttl:
+            return None
+        return PokemonNotInGame(key, reason, checked_at, detail)
+
+    def validators(self):
+        '''key -> (etag, last_modified, section_hash, checked_at) for every entry that was ever revalidated'''
+        with self._lock:
+            return dict((row[0], row[1:]) for row in self.conn.execute("SELECT key, etag, last_modified, section_hash, checked_at FROM Validators"))
+
+    def set_validators(self, rows):
+        '''Store (key, etag, last_modified, section_hash, checked_at) rows in a single transaction'''
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO Validators (key, etag, last_modified, section_hash, checked_at) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+            self._lru.clear()
+
+
+def migrate_json_cache(store, json_filename=CACHE_FILENAME):
+    ''' Copies the entries of the legacy JSON cache file into the cache store
 
     Parameters
     ----------
-    None
+    store: CacheStore
+        The store to fill
+    json_filename: string
+        Path of the legacy JSON cache
 
     Returns
     -------
-    The opened cache: dict
+    integer
+        number of entries migrated
     '''
     try:
-        cache_file = open(CACHE_FILENAME, 'r')
-        cache_contents = cache_file.read()
-        cache_dict = json.loads(cache_contents)
+        cache_file = open(json_filename, 'r')
+        legacy_cache = json.loads(cache_file.read())
         cache_file.close()
     except:
-        cache_dict = {}
-    return cache_dict
+        return 0
+    #entries already in the store are newer than the legacy file
+    new_entries = dict((key, value) for (key, value) in legacy_cache.items() if store.fetched_at(key) is None)
+    store.update(new_entries)
+    return len(new_entries)
+
+
+def open_cache():
+    ''' Opens the cache store, creating it if it does not exist yet.
+    The first time it is opened, the entries of the legacy JSON cache file are migrated into it.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    The opened cache: CacheStore
+    '''
+    global CACHE_DICT
+    if not isinstance(CACHE_DICT, CacheStore):
+        CACHE_DICT = CacheStore()
+        if len(CACHE_DICT) == 0:
+            migrate_json_cache(CACHE_DICT)
+    return CACHE_DICT
 
 
 def save_cache(cache_dict):
-    ''' Saves the current state of the cache to disk
+    ''' Saves the current state of the cache to disk.
+    The cache store writes every entry as soon as it is set, so this only has work to do
+    when handed a plain dict.
 
     Parameters
     ----------
@@ -52,10 +449,651 @@ def save_cache(cache_dict):
     -------
     None
     '''
-    dumped_json_cache = json.dumps(cache_dict)
-    fw = open(CACHE_FILENAME,"w")
-    fw.write(dumped_json_cache)
-    fw.close()
+    if not isinstance(cache_dict, CacheStore):
+        open_cache().update(cache_dict)
+
+#######################################################
+###PACKED, MEMORY-MAPPED CACHE SNAPSHOTS###############
+#######################################################
+
+#a packed snapshot of the cache: fixed-size binary records plus one table of interned strings.
+#Layout (little-endian):
+#   header   PACK_HEADER: magic, format version, record size, record count, string count, offset of the string table
+#   records  record count x PACK_RECORD_DTYPE, sorted by url
+#   strings  (string count + 1) uint32 offsets into the utf-8 bytes that follow them
+#Bump PACK_VERSION whenever the layout changes. Readers refuse other versions.
+PACKED_CACHE_FILENAME = "pokedex_cache.pack"
+PACK_MAGIC = b"PKDX"
+PACK_VERSION = 2
+PACK_HEADER = struct.Struct("<4sHHIIQ")
+#text fields, in record order. Each is the id of a string in the string table.
+PACK_TEXT_FIELDS = ("url", "name", "dex", "types", "classification", "height", "weight", "genderRatio")
+PACK_STAT_FIELDS = ("hp", "attack", "defense", "special_attack", "special_defense", "speed")
+#stats holds each stat as a number for whole-cache work. stat_values holds the id of the stat's original value as
+#JSON text (e.g. 45 or "45"), so a snapshot gives back exactly what was cached and its content hash doesn't change.
+PACK_RECORD_DTYPE = np.dtype([(field, "<u4") for field in PACK_TEXT_FIELDS] + [("stats", "<u2", (len(PACK_STAT_FIELDS),)), ("stat_values", "<u4", (len(PACK_STAT_FIELDS),)), ("type_mask", "<u4"), ("fetched_at", "<f8")])
+#stored for a stat that isn't a number
+PACK_MISSING_STAT = 0xFFFF
+#string id stored for a text field that is None, which no string in the table can have
+PACK_NONE_STRING = 0xFFFFFFFF
+
+def write_packed_cache(entries, filename=PACKED_CACHE_FILENAME):
+    '''Write cache entries to a packed snapshot. The file is replaced atomically.
+
+    Parameters
+    ----------
+    entries: iterable
+        (url, cached value, fetched_at) tuples, e.g. CacheStore.entries(). Values are JSON text or dicts
+        keyed like the attributes of a Pokemon instance.
+    filename: string
+        Path of the snapshot
+
+    Returns
+    -------
+    integer
+        number of records written
+    '''
+    strings = {}
+    def intern(text):
+        if text is None:
+            return PACK_NONE_STRING
+        if text not in strings:
+            strings[text] = len(strings)
+        return strings[text]
+    rows = []
+    for url, cached_value, fetched_at in sorted(entries, key=lambda entry: entry[0]):
+        pokemon = json.loads(cached_value) if isinstance(cached_value, str) else cached_value
+        stats = []
+        for stat in PACK_STAT_FIELDS:
+            value = parse_stat(pokemon[stat])
+            stats.append(PACK_MISSING_STAT if value is None or not 0 <= value < PACK_MISSING_STAT else value)
+        stat_values = [intern(json.dumps(pokemon[stat])) for stat in PACK_STAT_FIELDS]
+        text_ids = [intern(url)] + [intern(None if pokemon[field] is None else str(pokemon[field])) for field in PACK_TEXT_FIELDS[1:]]
+        rows.append(tuple(text_ids) + (stats, stat_values, types_to_mask(pokemon["types"]), fetched_at))
+    records = np.array(rows, dtype=PACK_RECORD_DTYPE)
+    encoded = [text.encode("utf-8") for text in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+    offsets[1:] = np.cumsum([len(text) for text in encoded])
+    strings_offset = PACK_HEADER.size + records.nbytes
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "wb") as pack_file:
+        pack_file.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, PACK_RECORD_DTYPE.itemsize, len(records), len(encoded), strings_offset))
+        pack_file.write(records.tobytes())
+        pack_file.write(offsets.tobytes())
+        pack_file.write(b"".join(encoded))
+    os.replace(temp_filename, filename)
+    return len(records)
+
+
+class PackedCache(Mapping):
+    '''Read-only, memory-mapped view of a snapshot written by write_packed_cache()
+
+    Opening a snapshot maps the file and reads the header, nothing else. records is a NumPy view straight
+    onto the mapped bytes, so whole-cache numeric work (e.g. records["stats"]) allocates almost nothing, and
+    strings are only decoded when an entry is asked for. Lookups by url are a binary search over the sorted records.
+
+    Instance Attributes
+    --------------
+    filename: string
+    Path of the snapshot
+
+    records: numpy array
+    One PACK_RECORD_DTYPE row per Pokemon, sorted by url
+    '''
+
+    def __init__(self, filename=PACKED_CACHE_FILENAME):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < PACK_HEADER.size:
+            self.close()
+            raise ValueError(filename + " is not a packed cache")
+        magic, version, record_size, record_count, string_count, strings_offset = PACK_HEADER.unpack_from(self._map)
+        if magic != PACK_MAGIC or version != PACK_VERSION or record_size != PACK_RECORD_DTYPE.itemsize:
+            self.close()
+            raise ValueError(filename + " is not a version " + str(PACK_VERSION) + " packed cache")
+        self.records = np.frombuffer(self._map, dtype=PACK_RECORD_DTYPE, count=record_count, offset=PACK_HEADER.size)
+        self._offsets = np.frombuffer(self._map, dtype="<u4", count=string_count + 1, offset=strings_offset)
+        self._text_start = strings_offset + self._offsets.nbytes
+
+    def string(self, string_id):
+        '''Decode one string of the string table, or None for PACK_NONE_STRING'''
+        if string_id == PACK_NONE_STRING:
+            return None
+        start = self._text_start + int(self._offsets[string_id])
+        end = self._text_start + int(self._offsets[string_id + 1])
+        return self._map[start:end].decode("utf-8")
+
+    def _position(self, url):
+        low, high = 0, len(self.records)
+        while low < high:
+            middle = (low + high) // 2
+            if self.string(self.records["url"][middle]) < url:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.records) and self.string(self.records["url"][low]) == url:
+            return low
+        return None
+
+    def record(self, position):
+        '''The entry at one position as a dict keyed like the attributes of a Pokemon instance'''
+        row = self.records[position]
+        pokemon = {}
+        #same key order as Pokemon.toJson(), so json.dumps() of the dict matches the cached JSON text
+        for field in ("name", "dex", "types"):
+            pokemon[field] = self.string(row[field])
+        for stat, value_id in zip(PACK_STAT_FIELDS, row["stat_values"].tolist()):
+            pokemon[stat] = json.loads(self.string(value_id))
+        for field in ("classification", "height", "weight", "genderRatio"):
+            pokemon[field] = self.string(row[field])
+        return pokemon
+
+    def __getitem__(self, url):
+        position = self._position(url)
+        if position is None:
+            raise KeyError(url)
+        return self.record(position)
+
+    def __iter__(self):
+        return (self.string(string_id) for string_id in self.records["url"])
+
+    def __len__(self):
+        return len(self.records)
+
+    def entries(self):
+        '''(url, dict, fetched_at) for every record, decoded one at a time. Accepted by load_cache_into_database().'''
+        for position in range(len(self.records)):
+            yield self.string(self.records["url"][position]), self.record(position), float(self.records["fetched_at"][position])
+
+    def close(self):
+        #views onto the map have to go before it can be closed
+        self.records = self._offsets = None
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def pack_cache(filename=PACKED_CACHE_FILENAME, json_filename=None):
+    '''Write a packed snapshot of the cache store, or of a legacy JSON cache file when json_filename is given
+
+    Parameters
+    ----------
+    filename: string
+        Path of the snapshot
+    json_filename: string
+        Legacy pokedex_cache.json to convert directly, without going through the cache store
+
+    Returns
+    -------
+    integer
+        number of records written
+    '''
+    if json_filename is not None:
+        with open(json_filename, "r") as cache_file:
+            legacy_cache = json.loads(cache_file.read())
+        #the legacy file has no timestamps, so its age stands in for them
+        fetched_at = os.path.getmtime(json_filename)
+        return write_packed_cache([(url, value, fetched_at) for (url, value) in legacy_cache.items()], filename)
+    return write_packed_cache(open_cache().entries(), filename)
+
+#######################################################
+###SHARED HTTP SESSION AND CONCURRENT PAGE CRAWLER#####
+#######################################################
+
+POKEMONDB_URL = 'https://pokemondb.net/pokedex/all'
+SEREBII_BASE_URL = "https://serebii.net/pokedex-swsh/"
+
+class GameDex:
+    '''One game's Pokedex on Serebii: where the page of each Pokemon lives and how it is read
+
+    Serebii addresses and lays out the Pokedex of every game differently, so each game in GAMES says both.
+    This class follows Sword and Shield (pages named after the Pokemon, read by parse_pokemon_page()).
+    A game with another scheme subclasses it and overrides page_url() and read_page().
+
+    Instance Attributes
+    --------------
+    title: string
+    Name of the game, e.g. "Sword and Shield"
+
+    base_url: string
+    Prefix of every Pokemon page of the game
+    '''
+
+    def __init__(self, title, base_url):
+        self.title = title
+        self.base_url = base_url
+
+    def page_url(self, slug, base_url=None):
+        '''Url of the page of one Pokemon. slug is its name as pokemondb.net writes it in urls (e.g. "mr-mime").
+        base_url replaces self.base_url, e.g. to fetch from a stand-in server.'''
+        return (base_url or self.base_url) + slug
+
+    def read_page(self, page_text):
+        '''(extracted sections, Pokemon instance) of one page. Raises when the page can't be read.'''
+        return read_pokemon_page(page_text)
+
+#game id -> GameDex. The Pokemon tables hold DEFAULT_GAME, and every game loaded is kept in its own Game_Pokemon partition.
+#Only register a game once its url scheme and page layout have been checked against Serebii: a page that 404s
+#or can't be read is remembered as "not in the game" for weeks (see ABSENT_TTL_SECONDS).
+GAMES = {
+    "swsh": GameDex("Sword and Shield", SEREBII_BASE_URL),
+}
+DEFAULT_GAME = "swsh"
+#more games whose Pokedex is laid out like Sword and Shield's, read by load_games() at startup:
+#{"GAME": {"title": "Game Title", "base_url": "https://serebii.net/pokedex-GAME/"}, ...}
+GAMES_FILENAME = "games.json"
+
+def register_game(game, title, base_url):
+    '''Add a game whose Pokedex pages are addressed and laid out like Sword and Shield's to GAMES.
+    Raises ValueError if its pages could be mistaken for another game's.'''
+    if not base_url.endswith("/"):
+        raise ValueError("base_url of " + repr(game) + " must end with /")
+    for other_game, game_dex in GAMES.items():
+        if other_game != game and (base_url.startswith(game_dex.base_url) or game_dex.base_url.startswith(base_url)):
+            raise ValueError("base_url of " + repr(game) + " overlaps the Pokedex of " + repr(other_game))
+    GAMES[game] = GameDex(title, base_url)
+    #urls made for an earlier registration of the game are stale
+    GAME_DICTIONARIES.pop(game, None)
+
+def load_games(filename=GAMES_FILENAME):
+    '''Register every game listed in filename (see GAMES_FILENAME). Nothing happens if the file doesn't exist.
+    Returns the ids of the games registered.'''
+    try:
+        with open(filename, encoding="utf-8") as games_file:
+            games = json.load(games_file)
+    except FileNotFoundError:
+        return []
+    for game, entry in games.items():
+        register_game(game, entry["title"], entry["base_url"])
+    return list(games)
+#local servers standing in for a game's Pokedex (e.g. ReplayServer): game -> base url. See add_stand_in().
+STAND_INS = {}
+
+def add_stand_in(base_url, game=DEFAULT_GAME):
+    '''Fetch the pages of game's Pokedex from a local server at base_url instead of Serebii.
+    Only the download goes to the stand-in: pages are still cached, crawled and loaded under the game's own urls,
+    so later runs without the stand-in find them.'''
+    STAND_INS[check_game(game)] = base_url
+
+def remove_stand_in(base_url):
+    '''Undo add_stand_in()'''
+    for game in [game for (game, stand_in) in STAND_INS.items() if stand_in == base_url]:
+        del STAND_INS[game]
+
+def stand_in_url(url):
+    '''The url a page is actually downloaded from: the same url, or its page on the game's stand-in server'''
+    game = game_of_url(url)
+    if game in STAND_INS:
+        return STAND_INS[game] + url[len(GAMES[game].base_url):]
+    return url
+
+def game_of_url(url):
+    '''The game whose Pokedex a url belongs to, or None for a url outside all of them'''
+    for game, game_dex in GAMES.items():
+        if url.startswith(game_dex.base_url):
+            return game
+    return None
+
+def read_game_page(url, page_text):
+    '''(extracted sections, Pokemon instance) of the page at url, read the way its game lays pages out.
+    Pages of urls outside every game are read as DEFAULT_GAME pages.'''
+    return GAMES[game_of_url(url) or DEFAULT_GAME].read_page(page_text)
+
+def check_game(game):
+    '''Raise ValueError unless game is a key of GAMES'''
+    if game not in GAMES:
+        raise ValueError("unknown game " + repr(game) + ", expected one of " + ", ".join(GAMES))
+    return game
+
+#crawl defaults: total worker threads, simultaneous requests per host, requests per second per host
+CRAWL_MAX_WORKERS = 8
+CRAWL_PER_HOST_LIMIT = 4
+CRAWL_REQUESTS_PER_SECOND = 5.0
+#retry failed fetches this many extra times, doubling the wait each attempt
+CRAWL_MAX_RETRIES = 3
+CRAWL_BACKOFF_SECONDS = 0.5
+CRAWL_TIMEOUT_SECONDS = 15
+#status codes worth retrying (rate limited or temporary server trouble)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class RateLimiter:
+    '''Thread-safe limiter that spaces out calls to at most a fixed number per second
+
+    Instance Attributes
+    --------------
+    interval: float
+    Minimum number of seconds between two calls. 0 disables the limit.
+    '''
+
+    def __init__(self, requests_per_second=CRAWL_REQUESTS_PER_SECOND):
+        if requests_per_second:
+            self.interval = 1.0 / requests_per_second
+        else:
+            self.interval = 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    #blocks until the caller is allowed to make its request
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PageCrawler:
+    '''Fetches pages over one pooled keep-alive requests.Session
+
+    Every host gets its own concurrency cap and rate limiter, so a crawl can hit
+    Serebii and a local stand-in server side by side without one starving the other.
+
+    Instance Attributes
+    --------------
+    max_workers: integer
+    Number of threads used by crawl()
+
+    per_host_limit: integer
+    Maximum number of requests in flight against a single host
+
+    requests_per_second: float
+    Maximum request rate against a single host. 0 or None disables the limit.
+
+    max_retries: integer
+    Extra attempts made after a connection error or a retryable status code
+
+    backoff: float
+    Seconds to wait before the first retry. Doubles on every following retry.
+
+    session: requests.Session
+    Shared session whose connection pool is reused by every fetch
+    '''
+
+    def __init__(self, max_workers=CRAWL_MAX_WORKERS, per_host_limit=CRAWL_PER_HOST_LIMIT, requests_per_second=CRAWL_REQUESTS_PER_SECOND, max_retries=CRAWL_MAX_RETRIES, backoff=CRAWL_BACKOFF_SECONDS, timeout=CRAWL_TIMEOUT_SECONDS, session=None):
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            #keep enough pooled connections around for every worker thread
+            adapter = HTTPAdapter(pool_connections=max(per_host_limit, 1), pool_maxsize=max(max_workers, 1))
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._host_limiters = {}
+
+    #per-host semaphore and rate limiter, created the first time a host is seen
+    def _host_controls(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(max(self.per_host_limit, 1))
+                self._host_limiters[host] = RateLimiter(self.requests_per_second)
+            return self._host_slots[host], self._host_limiters[host]
+
+    def fetch(self, url):
+        '''Download a single page, retrying transient failures with exponential backoff
+
+        Parameters
+        ----------
+        url: string
+            The page to download
+
+        Returns
+        -------
+        string
+            The decoded body of the page
+        '''
+        return self._get(url).text
+
+    def revalidate(self, url, etag=None, last_modified=None):
+        '''Download a page only if it changed since it was last seen, using If-None-Match / If-Modified-Since
+
+        Parameters
+        ----------
+        url: string
+            The page to check
+        etag: string
+            ETag header of the last download, if the site sent one
+        last_modified: string
+            Last-Modified header of the last download, if the site sent one
+
+        Returns
+        -------
+        tuple
+            (page text, or None if the site answered 304 Not Modified, new ETag, new Last-Modified, bytes received)
+        '''
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        response = self._get(url, headers)
+        #a 304 carries no body and keeps the validators the page was downloaded with
+        if response.status_code == 304:
+            return None, response.headers.get("ETag", etag), response.headers.get("Last-Modified", last_modified), 0
+        return response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"), len(response.content)
+
+    #one GET with the host limits and retries applied. Returns the response of the last attempt.
+    #Pages of a game with a stand-in (see add_stand_in()) are downloaded from the stand-in.
+    def _get(self, url, headers=None):
+        url = stand_in_url(url)
+        slots, limiter = self._host_controls(url)
+        attempt = 0
+        while True:
+            try:
+                with slots:
+                    limiter.wait()
+                    with PROFILER.stage("fetch"):
+                        response = self.session.get(url, headers=headers, timeout=self.timeout)
+                PROFILER.count("bytes fetched", len(response.content))
+                if response.status_code not in RETRY_STATUS_CODES:
+                    #anything else that failed (404 and friends) won't get better by asking again
+                    response.raise_for_status()
+                    return response
+                error = requests.HTTPError(str(response.status_code) + " error for url: " + url, response=response)
+            except (requests.ConnectionError, requests.Timeout) as network_error:
+                error = network_error
+            if attempt >= self.max_retries:
+                raise error
+            PROFILER.count("fetch retries")
+            time.sleep(self.backoff * (2 ** attempt))
+            attempt += 1
+
+    def crawl(self, urls, fetch=None):
+        '''Fetch many pages in parallel
+
+        Parameters
+        ----------
+        urls: iterable of strings
+            The pages to download. Duplicates are only fetched once.
+        fetch: function
+            Called with each url on a worker thread. Defaults to self.fetch.
+
+        Returns
+        -------
+        generator
+            yields (url, page_text, error) tuples in completion order, where page_text is whatever fetch returned.
+            page_text is None when error is set.
+        '''
+        unique_urls = list(dict.fromkeys(urls))
+        if not unique_urls:
+            return
+        if fetch is None:
+            fetch = self.fetch
+        pool = ThreadPoolExecutor(max_workers=max(self.max_workers, 1))
+        try:
+            futures = {pool.submit(fetch, url): url for url in unique_urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    yield url, future.result(), None
+                except Exception as error:
+                    yield url, None, error
+        finally:
+            #if the caller stops early (or Ctrl-C), pages not started yet are dropped instead of waited for
+            pool.shutdown(wait=False, cancel_futures=True)
+
+#one crawler (and connection pool) shared by the whole program
+CRAWLER = None
+
+def get_crawler():
+    ''' Returns the shared PageCrawler, creating it on first use
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    PageCrawler
+    '''
+    global CRAWLER
+    if CRAWLER is None:
+        CRAWLER = PageCrawler()
+    return CRAWLER
+
+#################################################
+###PARSER BACKENDS FOR SEREBII POKEDEX PAGES#####
+#################################################
+
+#lxml is optional. Without it every page goes through BeautifulSoup's html.parser.
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+#where recorded pages live for offline parsing and benchmarks
+FIXTURE_DIR = "fixtures"
+#small hand-written pages kept in the repository, covering the markup where the parser backends used to disagree
+#(\r\n inside tags and text, an XML declaration). "--benchmark-parsers parser_fixtures" checks them.
+PARSER_FIXTURE_DIR = "parser_fixtures"
+
+def extract_with_html_parser(page_text):
+    '''Pull the raw text of the cells parse_pokemon_page() needs out of a page using BeautifulSoup's html.parser.
+    This is the reference backend every other backend must agree with.
+
+    Parameters
+    ----------
+    page_text: string
+        The html of a Pokemon Dex page in Serebii.net
+
+    Returns
+    -------
+    tuple
+        (fooinfo cell texts, typeimg alt texts, base stats table cell texts)
+    '''
+    soup = BeautifulSoup(page_text, 'html.parser')
+    #Finds almost all of the information on each Pokemon's page on Serebii
+    cells = soup.find_all(class_ = "fooinfo")
+    #Types have a different class tag
+    type_cells = soup.find_all(class_ = "typeimg")
+    #Base stats require specific find since they are listed after TMs on the Serebii page, which are different per each Pokemon
+    base_stats_table = soup.find('a', attrs={'name': 'stats'}).find_next('table')
+    base_stats = base_stats_table.find_all('td')
+    return [cell.text for cell in cells], [type_cell['alt'] for type_cell in type_cells], [stat.text for stat in base_stats]
+
+#a \r in text, i.e. one whose next angle bracket opens a tag (or that comes after the last tag), as opposed to a \r between the attributes of a tag
+TEXT_CR_PATTERN = re.compile(r'\r(?=[^<>]*(?:<|$))')
+#lxml refuses a str that declares its own encoding. html.parser skips the declaration, so it can simply be dropped.
+XML_DECLARATION_PATTERN = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+def extract_with_lxml(page_text):
+    '''Same as extract_with_html_parser() but built on lxml's C parser and XPath, which is several times faster.
+
+    Parameters
+    ----------
+    page_text: string
+        The html of a Pokemon Dex page in Serebii.net
+
+    Returns
+    -------
+    tuple
+        (fooinfo cell texts, typeimg alt texts, base stats table cell texts)
+    '''
+    #libxml2 turns \r\n into \n, but the cleaning in parse_pokemon_page expects the \r to still be there.
+    #Only text is escaped: an escaped \r inside a tag would break the tag and merge the cells after it.
+    document = lxml.html.fromstring(TEXT_CR_PATTERN.sub('&#13;', XML_DECLARATION_PATTERN.sub('', page_text, count=1)))
+    cells = document.xpath('//*[contains(concat(" ", normalize-space(@class), " "), " fooinfo ")]')
+    type_cells = document.xpath('//*[contains(concat(" ", normalize-space(@class), " "), " typeimg ")]')
+    base_stats_tables = document.xpath('//a[@name="stats"]/following::table[1]')
+    if not base_stats_tables:
+        raise ValueError("page has no base stats table")
+    return [cell.text_content() for cell in cells], [type_cell.get('alt') for type_cell in type_cells], [stat.text_content() for stat in base_stats_tables[0].iter('td')]
+
+PARSER_BACKENDS = {"html.parser": extract_with_html_parser}
+if lxml is not None:
+    PARSER_BACKENDS["lxml"] = extract_with_lxml
+DEFAULT_PARSER = "lxml" if lxml is not None else "html.parser"
+
+def benchmark_parsers(fixture_dir=FIXTURE_DIR, repeat=3):
+    '''Time every parser backend over the recorded pages in fixture_dir/pages, parsing only (no network, no cache),
+    and check that each backend builds exactly the same Pokemon as html.parser.
+
+    Parameters
+    ----------
+    fixture_dir: string
+        Directory the pages were recorded into
+    repeat: integer
+        How many times each page is parsed per backend. The fastest run is kept.
+
+    Returns
+    -------
+    dict
+        per backend: number of pages, best total seconds, milliseconds per page, and the pages whose result differed
+    '''
+    page_dir = os.path.join(fixture_dir, "pages")
+    pages = []
+    for filename in sorted(os.listdir(page_dir)):
+        #newline="" keeps \r\n as served, which is exactly where the backends used to disagree
+        with open(os.path.join(page_dir, filename), encoding="utf-8", newline="") as page_file:
+            pages.append((filename, page_file.read()))
+    #html.parser is the reference. Pages it can't parse (Pokemon missing from the game) must fail on every backend.
+    expected = {}
+    for filename, page_text in pages:
+        try:
+            expected[filename] = parse_pokemon_page(page_text, "html.parser").toDict()
+        except Exception:
+            expected[filename] = None
+    results = {}
+    for backend in PARSER_BACKENDS:
+        best = None
+        for attempt in range(repeat):
+            start = time.perf_counter()
+            for filename, page_text in pages:
+                try:
+                    parse_pokemon_page(page_text, backend, fallback=False)
+                except Exception:
+                    pass
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        mismatches = []
+        for filename, page_text in pages:
+            try:
+                parsed = parse_pokemon_page(page_text, backend, fallback=False).toDict()
+            except Exception:
+                parsed = None
+            if parsed != expected[filename]:
+                mismatches.append(filename)
+        results[backend] = {"pages": len(pages), "seconds": best, "ms_per_page": 1000 * best / max(len(pages), 1), "mismatches": mismatches}
+        print(backend + ": " + str(len(pages)) + " pages in " + format(best, ".3f") + "s (" + format(results[backend]["ms_per_page"], ".2f") + " ms/page), " + str(len(mismatches)) + " mismatches" + (" (" + ", ".join(mismatches) + ")" if mismatches else ""))
+    return results
 
 #################################################
 ###POKEMON CLASS AND CONSTRUCTING DICTIONARIES###
@@ -132,341 +1170,3486 @@ class Pokemon:
             for (key, value) in self.__dict__.items()
             )
 
-def build_pokemon_dict():
+def build_pokemon_dict(index_url=POKEMONDB_URL, base_url=None, game=DEFAULT_GAME):
     ''' Make a dictionary that maps Pokemon name to Serebii Pokedex url from "https://serebii.net/pokedex-swsh"
 
     Parameters
     ----------
-    None
+    index_url: string
+        The pokemondb.net page listing every Pokemon
+    base_url: string
+        Prefix of the Serebii Pokedex pages, e.g. a stand-in server. The game's own Serebii Pokedex when None.
+    game: string
+        Key of GAMES whose page_url() builds the urls
 
     Returns
     -------
     dict
-        key is a Pokemon name and value is the url
-        e.g. {'Pikachu':'https://serebii.net/pokedex-swsh/Pikachu', ...}
+        key is a Pokemon name normalized by normalize_name() and value is the url
+        e.g. {'pikachu':'https://serebii.net/pokedex-swsh/pikachu', ...}
     '''
+    game_dex = GAMES[check_game(game)]
     ###using response and soup to parse the page for state list elements
     #getting pokemon names from pokemondb.net instead of serebii formatting is messy to parse for pokemon names
-    url = 'https://pokemondb.net/pokedex/all'
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    page_text = get_crawler().fetch(index_url)
+    with PROFILER.stage("parse name index"):
+        soup = BeautifulSoup(page_text, 'html.parser')
     pokemon_list_elements = soup.find_all(class_ = "ent-name")
 
     ###making dictionary that maps state name to state page url
     serebii_url_dict = {}
-    base_url = "https://serebii.net/pokedex-swsh/"
     #constructing the full url based off of the BS4 scraping results
     for list_element in pokemon_list_elements:
         db_url = list_element["href"]
         pokemon_name = db_url[9:]
-        full_url = base_url + pokemon_name
-        serebii_url_dict[list_element.string.lower()] = full_url
+        full_url = game_dex.page_url(pokemon_name, base_url)
+        #keyed the same way lookups are, so names with a curly apostrophe like Sirfetch’d are found
+        serebii_url_dict[normalize_name(list_element.string)] = full_url
     return(serebii_url_dict)
 
-def get_pokemon_instance(site_url):
-    '''Make an instance from a Pokemon URL.
+#the name to url dictionary is saved here so it only has to be downloaded again once it gets old
+NAME_INDEX_FILENAME = "pokemon_names.json"
+NAME_INDEX_MAX_AGE = 30 * 24 * 60 * 60
+POKEMON_DICTIONARY = None
+#name to url dictionaries of other games, game -> dict, made from POKEMON_DICTIONARY the first time each is needed
+GAME_DICTIONARIES = {}
+NAME_INDEX = None
+
+def load_pokemon_dict(max_age=NAME_INDEX_MAX_AGE, allow_network=True, filename=NAME_INDEX_FILENAME):
+    ''' Returns the name to url dictionary saved on disk, downloading it again with build_pokemon_dict()
+    when the saved copy is missing or older than max_age. If the download fails, a stale copy is still used.
 
     Parameters
     ----------
-    site_url: string
-        The URL for a Pokemon Dex page in Serebii.net
+    max_age: float
+        Seconds the saved dictionary stays fresh
+    allow_network: bool
+        Whether a missing or stale dictionary may be downloaded again
+    filename: string
+        Where the dictionary is saved
 
     Returns
     -------
-    instance
-        a  Pokemon instance
+    dict
+        key is a Pokemon name normalized by normalize_name() and value is the url.
+        Empty if there is no saved copy and it can't be downloaded.
     '''
-    CACHE_DICT = open_cache()
-    #If Pokemon object is in the Cache Dictionary, retrieve that data instead of scraping the page
-    if site_url in CACHE_DICT:
-        print("Fetching cached data")
-        return CACHE_DICT[site_url]
-    else:
-        print("Making new entry")
-        #If Pokemon object not already in the Cache dictionary, use BS4 to scrape the page for the appropriate Pokemon objects
-        response = requests.get(site_url)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        #Finds almost all of the information on each Pokemon's page on Serebii
-        cells = soup.find_all(class_ = "fooinfo")
-        #Types have a different class tag
-        type_cells = soup.find_all(class_ = "typeimg")
-        #Base stats require specific find since they are listed after TMs on the Serebii page, which are different per each Pokemon
-        base_stats_table = soup.find('a', attrs={'name': 'stats'}).find_next('table')
-        base_stats = base_stats_table.findAll('td')
-        #name of the Pokemon
-        name = cells[1].text.strip()
-        #dex number of the Pokemon
-        dex = cells[3].text.replace('\n',' ').strip()
-        #Pokemon can have 1-2 types
-        if len(type_cells) == 1:
-            type1 = type_cells[0]['alt']
-            pokemon_types = type1
+    saved = None
+    try:
+        with open(filename, encoding="utf-8") as names_file:
+            saved = json.load(names_file)
+    except (OSError, ValueError):
+        pass
+    #a file without both keys is treated like a missing one and downloaded again
+    if not (isinstance(saved, dict) and isinstance(saved.get("fetched_at"), (int, float)) and isinstance(saved.get("names"), dict)):
+        saved = None
+    if saved is not None:
+        #copies saved before names were normalized are keyed by name.lower(), so they are keyed again here
+        saved["names"] = dict((normalize_name(name), url) for (name, url) in saved["names"].items())
+    if saved is not None and (not allow_network or time.time() - saved["fetched_at"] <= max_age):
+        return saved["names"]
+    if allow_network:
+        try:
+            names = build_pokemon_dict()
+        except requests.RequestException:
+            print("[Error] Could not reach pokemondb.net to refresh the list of Pokemon names")
         else:
-            type1 = type_cells[0]['alt']
-            type2 = type_cells[1]['alt']
-            pokemon_types = type1 + " and " + type2
-        #hp, attack, defense, special attack, special defense, and speed of Pokemon
-        hp = base_stats[9].text.strip()
-        attack = base_stats[10].text.strip()
-        defense = base_stats[11].text.strip()
-        special_attack = base_stats[12].text.strip()
-        special_defense = base_stats[13].text.strip()
-        speed = base_stats[14].text.strip()
-        #classification, height, weight, and gender ratio of the Pokemon. Height, Weight, and Gender Ratio are formatted awkwardly and require more cleaning.
-        classification = cells[5].text.strip()
-        height = cells[6].text.replace("\'", "ft ").replace('"', 'in').replace('\r\n\t\t\t', ' ').strip()
-        weight = cells[7].text.replace('\r\n\t\t\t', ' ').strip()
-        gender_ratio = cells[4].text.replace(':', ': ').replace('%', '% ').strip()
-        #calling class object Pokemon based on the scrapped page data above
-        This_Pokemon = Pokemon(name, dex, pokemon_types, hp, attack, defense, special_attack, special_defense, speed, classification, height, weight, gender_ratio)
-        #saving the Pokemon into the Cache Dictionary
-        CACHE_DICT[site_url] = This_Pokemon.toJson()
-        save_cache(CACHE_DICT)
-        return CACHE_DICT[site_url]
-
-##################################################
-###Creating Database Tables with SQL and Python###
-##################################################
+            #write to a temporary file first so a crash never leaves half a dictionary behind
+            with open(filename + ".tmp", "w", encoding="utf-8") as names_file:
+                json.dump({"fetched_at": time.time(), "names": names}, names_file)
+            os.replace(filename + ".tmp", filename)
+            return names
+    if saved is not None:
+        return saved["names"]
+    return {}
 
-def make_pokemon_data_table():
-    '''Function to make PokemonData in sqlite with two tables: Pokemon and Pokemon_Extra
+def get_pokemon_dictionary(game=DEFAULT_GAME):
+    ''' Returns the name to url dictionary, loading it with load_pokemon_dict() the first time it is needed.
+    If there is no saved copy and pokemondb.net can't be reached, an empty dictionary is returned and loading is retried next call.
 
     Parameters
     ----------
-    None
+    game: string
+        Key of GAMES. Every game shares the saved names, and its page_url() turns them into urls.
 
     Returns
     -------
-    Object
-        a Sqlite Object
+    dict
+        key is a Pokemon name and value is the url
     '''
-    #establish and connect to new table PokemonData
-    conn = sqlite3.connect("PokemonData.sqlite")
-    cur = conn.cursor()
+    global POKEMON_DICTIONARY
+    if POKEMON_DICTIONARY is None:
+        names = load_pokemon_dict()
+        if not names:
+            return {}
+        POKEMON_DICTIONARY = names
+    if game == DEFAULT_GAME:
+        return POKEMON_DICTIONARY
+    if game not in GAME_DICTIONARIES:
+        #the saved dictionary holds Sword and Shield urls, whose last part is the pokemondb.net slug
+        game_dex = GAMES[check_game(game)]
+        GAME_DICTIONARIES[game] = dict((name, game_dex.page_url(url[len(SEREBII_BASE_URL):]) if url.startswith(SEREBII_BASE_URL) else url) for (name, url) in POKEMON_DICTIONARY.items())
+    return GAME_DICTIONARIES[game]
 
-    #make sure Pokemon doesn't already exist
-    drop_pokemon = '''
+def get_name_index():
+    ''' Returns the NameIndex over every Pokemon name, building it the first time it is needed
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    NameIndex
+    '''
+    global NAME_INDEX
+    if NAME_INDEX is None:
+        pokemon_dictionary = get_pokemon_dictionary()
+        if not pokemon_dictionary:
+            return NameIndex([])
+        NAME_INDEX = NameIndex(pokemon_dictionary)
+    return NAME_INDEX
+
+def enable_name_completion():
+    ''' Lets the Tab key complete Pokemon names at the prompt, where the readline module is available
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    '''
+    try:
+        import readline
+    except ImportError:
+        return
+    def complete_name(text, state):
+        matches = get_name_index().complete(text)
+        if state < len(matches):
+            return matches[state]
+        return None
+    #names like "mr. mime" contain spaces and dots, so only newlines split words
+    readline.set_completer_delims("\n")
+    readline.set_completer(complete_name)
+    readline.parse_and_bind("tab: complete")
+
+def edit_distance(first, second, limit):
+    '''Levenshtein distance between two strings, giving up as soon as it is certain to exceed limit
+
+    Parameters
+    ----------
+    first: string
+    second: string
+    limit: integer
+        Largest distance worth computing exactly
+
+    Returns
+    -------
+    integer
+        the distance, or limit + 1 if it is larger than limit
+    '''
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous_row = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current_row = [i]
+        for j, second_char in enumerate(second, 1):
+            current_row.append(min(previous_row[j] + 1, current_row[j - 1] + 1, previous_row[j - 1] + (first_char != second_char)))
+        if min(current_row) > limit:
+            return limit + 1
+        previous_row = current_row
+    return previous_row[-1]
+
+class NameIndex:
+    '''In-memory search index over Pokemon names for prefix completion and "did you mean" suggestions
+
+    Prefix completion is a binary search over the sorted names. Suggestions use an index from
+    every 3-letter piece of a name to the names containing it, so only the few names sharing
+    the most pieces with the typed text get the more expensive edit distance check.
+
+    Instance Attributes
+    --------------
+    names: list
+    Every normalized name, sorted
+
+    trigrams: dict
+    Maps a 3-letter piece to the positions in names that contain it
+    '''
+
+    def __init__(self, names):
+        self.names = sorted(set(normalize_name(name) for name in names))
+        self.trigrams = {}
+        for position, name in enumerate(self.names):
+            for trigram in self._trigrams(name):
+                self.trigrams.setdefault(trigram, []).append(position)
+
+    #names are padded so the first and last letters count as much as the middle ones
+    @staticmethod
+    def _trigrams(name):
+        padded = "  " + name + " "
+        return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    def complete(self, prefix, limit=10):
+        '''Names starting with prefix, in alphabetical order
+
+        Parameters
+        ----------
+        prefix: string
+            The start of a name, in any case
+        limit: integer
+            Most names returned
+
+        Returns
+        -------
+        list
+        '''
+        prefix = normalize_name(prefix)
+        start = bisect.bisect_left(self.names, prefix)
+        matches = []
+        for name in self.names[start:start + limit]:
+            if not name.startswith(prefix):
+                break
+            matches.append(name)
+        return matches
+
+    def suggest(self, text, limit=3, max_distance=2, candidates=12):
+        '''Names closest to a misspelled name
+
+        Parameters
+        ----------
+        text: string
+            What was typed
+        limit: integer
+            Most names returned
+        max_distance: integer
+            Most single-letter edits a suggestion may be away from text
+        candidates: integer
+            How many names sharing the most 3-letter pieces get their edit distance checked
+
+        Returns
+        -------
+        list
+            names ordered from closest to furthest
+        '''
+        text = normalize_name(text)
+        shared = {}
+        for trigram in self._trigrams(text):
+            for position in self.trigrams.get(trigram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        best = sorted(shared, key=lambda position: -shared[position])[:candidates]
+        scored = []
+        for position in best:
+            distance = edit_distance(text, self.names[position], max_distance)
+            if distance <= max_distance:
+                scored.append((distance, -shared[position], self.names[position]))
+        scored.sort()
+        return [name for (distance, overlap, name) in scored[:limit]]
+
+def parse_stat(stat_text):
+    '''Base stats are scraped as text. Returns the stat as an integer, or None if the cell holds no number.'''
+    try:
+        return int(stat_text)
+    except (TypeError, ValueError):
+        return None
+
+def parse_first_number(pattern, text):
+    '''Returns the number captured by the first match of pattern in text as a float, or None if there is no match.'''
+    match = re.search(pattern, text or "")
+    if match is None:
+        return None
+    return float(match.group(1))
+
+def parse_height(height):
+    '''Height in meters from a cleaned height string like "2ft 04in 0.7m"'''
+    return parse_first_number(r'([\d.]+)m\b', height)
+
+def parse_weight(weight):
+    '''Weight in kilograms from a cleaned weight string like "15.2lbs 6.9kg"'''
+    return parse_first_number(r'([\d.]+)kg\b', weight)
+
+def parse_gender_ratio(gender_ratio):
+    '''Male and female percentages from a cleaned gender string like "Male ♂: 88.14% Female ♀: 11.86%".
+    Both are None for genderless Pokemon.'''
+    return parse_first_number(r'Male[^:]*:\s*([\d.]+)%', gender_ratio), parse_first_number(r'Female[^:]*:\s*([\d.]+)%', gender_ratio)
+
+def parse_dex_number(dex):
+    '''National dex number from a dex string like "National: #001 Galar: #Foreign ..."'''
+    number = parse_first_number(r'#(\d+)', dex)
+    if number is None:
+        return None
+    return int(number)
+
+#the 18 types, in the order of the bits of a type mask and the rows/columns of TYPE_EFFECTIVENESS
+TYPE_NAMES = ("normal", "fire", "water", "electric", "grass", "ice", "fighting", "poison", "ground",
+    "flying", "psychic", "bug", "rock", "ghost", "dragon", "dark", "steel", "fairy")
+TYPE_BITS = dict((type_name, 1 << bit) for (bit, type_name) in enumerate(TYPE_NAMES))
+TYPE_PATTERN = re.compile(r'\b(' + '|'.join(TYPE_NAMES) + r')\b')
+
+def parse_types(types):
+    '''Type names in a types string like "Fire-type and Flying-type", lowercased, in order and without repeats'''
+    found = []
+    for type_name in TYPE_PATTERN.findall(types.lower()):
+        if type_name not in found:
+            found.append(type_name)
+    return found
+
+def types_to_mask(types):
+    '''18-bit type mask (see TYPE_BITS) of a types string'''
+    mask = 0
+    for type_name in parse_types(types):
+        mask |= TYPE_BITS[type_name]
+    return mask
+
+def mask_types(mask):
+    '''Type names of the bits set in a type mask, in TYPE_NAMES order'''
+    return [type_name for type_name in TYPE_NAMES if mask & TYPE_BITS[type_name]]
+
+def type_bit(type_name):
+    '''Bit of one type name in any case, e.g. "Fire" or "fire-type". Raises ValueError for anything else.'''
+    found = parse_types(type_name)
+    if len(found) != 1:
+        raise ValueError("type must be one of " + ", ".join(TYPE_NAMES))
+    return TYPE_BITS[found[0]]
+
+def parse_pokemon_page(page_text, parser=None, fallback=True):
+    '''Make a Pokemon instance out of the html of a Serebii Pokedex page.
+
+    Parameters
+    ----------
+    page_text: string
+        The html of a Pokemon Dex page in Serebii.net
+    parser: string
+        Name of the backend in PARSER_BACKENDS used to read the page. Defaults to DEFAULT_PARSER.
+    fallback: bool
+        Retry with the reference html.parser backend if the chosen backend can't read the page
+
+    Returns
+    -------
+    instance
+        a Pokemon instance
+    '''
+    return read_pokemon_page(page_text, parser, fallback)[1]
+
+def read_pokemon_page(page_text, parser=None, fallback=True):
+    '''Extract the sections of a Serebii Pokedex page and make a Pokemon out of them, retrying with the reference
+    html.parser backend if the chosen backend can't read the page. Shared by parse_pokemon_page() and section_hash().
+
+    Parameters
+    ----------
+    page_text: string
+        The html of a Pokemon Dex page in Serebii.net
+    parser: string
+        Name of the backend in PARSER_BACKENDS used to read the page. Defaults to DEFAULT_PARSER.
+    fallback: bool
+        Retry with html.parser if the chosen backend fails
+
+    Returns
+    -------
+    tuple
+        (the extracted (cells, type_cells, base_stats), a Pokemon instance)
+    '''
+    if parser is None:
+        parser = DEFAULT_PARSER
+    with PROFILER.stage("parse"):
+        try:
+            sections = PARSER_BACKENDS[parser](page_text)
+            return sections, build_pokemon_from_cells(*sections)
+        except Exception:
+            if not fallback or parser == "html.parser":
+                raise
+        PROFILER.count("parser fallbacks")
+        sections = extract_with_html_parser(page_text)
+        return sections, build_pokemon_from_cells(*sections)
+
+def build_pokemon_from_cells(cells, type_cells, base_stats):
+    '''Clean the raw cell texts pulled out of a Serebii page by a parser backend and make a Pokemon instance
+
+    Parameters
+    ----------
+    cells: list
+        text of every "fooinfo" cell, in page order
+    type_cells: list
+        alt text of every "typeimg" image, in page order
+    base_stats: list
+        text of every cell in the base stats table
+
+    Returns
+    -------
+    instance
+        a Pokemon instance
+    '''
+    #name of the Pokemon
+    name = cells[1].strip()
+    #dex number of the Pokemon
+    dex = cells[3].replace('\n',' ').strip()
+    #Pokemon can have 1-2 types
+    if len(type_cells) == 1:
+        type1 = type_cells[0]
+        pokemon_types = type1
+    else:
+        type1 = type_cells[0]
+        type2 = type_cells[1]
+        pokemon_types = type1 + " and " + type2
+    #hp, attack, defense, special attack, special defense, and speed of Pokemon, stored as numbers
+    hp = parse_stat(base_stats[9].strip())
+    attack = parse_stat(base_stats[10].strip())
+    defense = parse_stat(base_stats[11].strip())
+    special_attack = parse_stat(base_stats[12].strip())
+    special_defense = parse_stat(base_stats[13].strip())
+    speed = parse_stat(base_stats[14].strip())
+    #classification, height, weight, and gender ratio of the Pokemon. Height, Weight, and Gender Ratio are formatted awkwardly and require more cleaning.
+    classification = cells[5].strip()
+    height = cells[6].replace("\'", "ft ").replace('"', 'in').replace('\r\n\t\t\t', ' ').strip()
+    weight = cells[7].replace('\r\n\t\t\t', ' ').strip()
+    gender_ratio = cells[4].replace(':', ': ').replace('%', '% ').strip()
+    #calling class object Pokemon based on the scrapped page data above
+    return Pokemon(name, dex, pokemon_types, hp, attack, defense, special_attack, special_defense, speed, classification, height, weight, gender_ratio)
+
+def absent_reason(error):
+    '''Decide what a failed page means. A 404 or an unreadable page means the Pokemon isn't in the game and the
+    matching ABSENT_* reason is returned. Anything else (timeouts, dropped connections, server errors) is worth
+    trying again later and gives None.'''
+    if isinstance(error, requests.HTTPError):
+        if error.response is not None and error.response.status_code == 404:
+            return ABSENT_NOT_FOUND
+        return None
+    if isinstance(error, requests.RequestException):
+        return None
+    return ABSENT_PARSE_ERROR
+
+def get_pokemon_instance(site_url, page_text=None):
+    '''Make an instance from a Pokemon URL.
+
+    Parameters
+    ----------
+    site_url: string
+        The URL for a Pokemon Dex page in Serebii.net, in the Pokedex of any game in GAMES
+    page_text: string
+        Already downloaded html for site_url (e.g. from PageCrawler.crawl). Fetched when None.
+
+    Returns
+    -------
+    instance
+        a  Pokemon instance
+
+    Raises PokemonNotInGame when the page is missing or unreadable (remembered, so the next call answers
+    without fetching), and requests.RequestException for network trouble worth retrying.
+    '''
+    CACHE_DICT = open_cache()
+    #If Pokemon object is in the Cache Dictionary, retrieve that data instead of scraping the page
+    if site_url in CACHE_DICT:
+        PROFILER.count("cache hits")
+        print("Fetching cached data")
+        return CACHE_DICT[site_url]
+    known_absent = CACHE_DICT.absent(site_url)
+    if known_absent is not None:
+        PROFILER.count("negative cache hits")
+        raise known_absent
+    else:
+        PROFILER.count("cache misses")
+        print("Making new entry")
+        #If Pokemon object not already in the Cache dictionary, use BS4 to scrape the page for the appropriate Pokemon objects
+        try:
+            if page_text is None:
+                page_text = get_crawler().fetch(site_url)
+            This_Pokemon = read_game_page(site_url, page_text)[1]
+        except Exception as error:
+            reason = absent_reason(error)
+            if reason is None:
+                raise
+            raise CACHE_DICT.mark_absent(site_url, reason, str(error)) from error
+        #saving the Pokemon into the Cache Dictionary
+        CACHE_DICT[site_url] = This_Pokemon.toJson()
+        save_cache(CACHE_DICT)
+        return CACHE_DICT[site_url]
+
+##################################################
+###Creating Database Tables with SQL and Python###
+##################################################
+
+DATABASE_FILENAME = "PokemonData.sqlite"
+#bump whenever the tables below change. Older databases are migrated in place when opened.
+SCHEMA_VERSION = 9
+#SQLite allows at most 999 parameters in one statement
+POKEMON_READ_CHUNK = 500
+#stats with leaderboards and per-type aggregates: the six base stats and their total
+LEADERBOARD_STATS = ("hp", "attack", "defense", "special_attack", "special_defense", "speed", "base_stat_total")
+#how many of the first 151 Pokemon are in Sword and Shield. A database with fewer rows is still being built.
+FIRST_151_IN_GAME = 110
+
+def make_pokemon_data_table(conn=None):
+    '''Function to make PokemonData in sqlite with two tables: Pokemon and Pokemon_Extra
+    plus the Pokemon_Type relation, the Type_Stats aggregates, the per-game Game_Pokemon partitions with their shared Stat_Record
+    and Info_Record rows, the Pokemon_Sync bookkeeping table, and stamp the database with SCHEMA_VERSION.
+    Any existing rows are dropped.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to build the tables in. A new connection to PokemonData is opened (and closed) when None.
+
+    Returns
+    -------
+    None
+    '''
+    #establish and connect to new table PokemonData
+    own_connection = conn is None
+    if own_connection:
+        conn = sqlite3.connect(DATABASE_FILENAME)
+    cur = conn.cursor()
+
+    #make sure Pokemon doesn't already exist
+    drop_pokemon = '''
         DROP TABLE IF EXISTS Pokemon;
     '''
-    #make table Pokemon with name, class, types, and stats
-    create_pokemon = '''
-        CREATE TABLE IF NOT EXISTS Pokemon(
-            name TEXT PRIMARY KEY,
-            classification TEXT NOT NULL,
-            types TEXT NOT NULL,
-            hp INTEGER NOT NULL,
-            attack INTEGER NOT NULL,
-            defense INTEGER NOT NULL,
-            special_attack INTEGER NOT NULL,
-            special_defense INTEGER NOT NULL,
-            speed INTEGER NOT NULL
-        );
+    #make table Pokemon with name, class, types, and stats
+    #a stat cell that holds no number is stored as NULL, so one odd page never fails the whole load
+    create_pokemon = '''
+        CREATE TABLE IF NOT EXISTS Pokemon(
+            name TEXT PRIMARY KEY,
+            classification TEXT NOT NULL,
+            types TEXT NOT NULL,
+            hp INTEGER,
+            attack INTEGER,
+            defense INTEGER,
+            special_attack INTEGER,
+            special_defense INTEGER,
+            speed INTEGER,
+            name_key TEXT NOT NULL,
+            type_mask INTEGER NOT NULL,
+            base_stat_total INTEGER
+        );
+    '''
+    #typed names are matched against the normalized name_key, so it gets its own index
+    create_pokemon_index = '''
+        CREATE UNIQUE INDEX IF NOT EXISTS Pokemon_Name_Key ON Pokemon(name_key);
+    '''
+    #execute the drop + creation of Pokemon
+    cur.execute(drop_pokemon)
+    cur.execute(create_pokemon)
+    cur.execute(create_pokemon_index)
+
+    #make sure Pokemon_Extra doesn't exist
+    drop_extra_data = '''
+        DROP TABLE IF EXISTS Pokemon_Extra;
+    '''
+    #create Pokemon_Extra with dex number, height, weight, gender_ratio. Also add name as foreign key
+    #the text columns keep the scraped wording, the numeric columns hold the same values parsed for sorting and filtering
+    create_extra_data = '''
+        CREATE TABLE IF NOT EXISTS Pokemon_Extra(
+            dex TEXT PRIMARY KEY,
+            height TEXT NOT NULL,
+            weight TEXT NOT NULL,
+            gender_ratio TEXT NOT NULL,
+            name TEXT NOT NULL,
+            dex_number INTEGER,
+            height_m REAL,
+            weight_kg REAL,
+            male_ratio REAL,
+            female_ratio REAL,
+            FOREIGN KEY (name) REFERENCES Pokemon(name)
+        );
+    '''
+
+    #lookups join Pokemon_Extra on name rather than on its dex primary key
+    create_extra_index = '''
+        CREATE INDEX IF NOT EXISTS Pokemon_Extra_Name ON Pokemon_Extra(name);
+    '''
+
+    #execute drop + creation of Pokemon_Extra
+    cur.execute(drop_extra_data)
+    cur.execute(create_extra_data)
+    cur.execute(create_extra_index)
+
+    #Pokemon_Type holds one row per type of each Pokemon, so "every Fire Pokemon" is an index range instead of a LIKE scan
+    drop_type = '''
+        DROP TABLE IF EXISTS Pokemon_Type;
+    '''
+    create_type = '''
+        CREATE TABLE IF NOT EXISTS Pokemon_Type(
+            type TEXT NOT NULL,
+            name TEXT NOT NULL,
+            slot INTEGER NOT NULL,
+            PRIMARY KEY (type, name),
+            FOREIGN KEY (name) REFERENCES Pokemon(name)
+        ) WITHOUT ROWID;
+    '''
+    create_type_index = '''
+        CREATE INDEX IF NOT EXISTS Pokemon_Type_Name ON Pokemon_Type(name);
+    '''
+    cur.execute(drop_type)
+    cur.execute(create_type)
+    cur.execute(create_type_index)
+
+    #Type_Stats holds the count, sum and sum of squares of every stat per type ("all" for the whole dex).
+    #insert_pokemon_rows() keeps it up to date row by row, so averages per type never need a full scan.
+    drop_type_stats = '''
+        DROP TABLE IF EXISTS Type_Stats;
+    '''
+    create_type_stats = '''
+        CREATE TABLE IF NOT EXISTS Type_Stats(
+            type TEXT NOT NULL,
+            stat TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            total REAL NOT NULL,
+            total_squares REAL NOT NULL,
+            PRIMARY KEY (type, stat)
+        ) WITHOUT ROWID;
+    '''
+    cur.execute(drop_type_stats)
+    cur.execute(create_type_stats)
+
+    #every game loaded gets a partition in Game_Pokemon: one row per Pokemon with its game-specific dex entry
+    #and the hashes of its stats and metadata. Stat_Record and Info_Record are content-addressed by those hashes,
+    #so a Pokemon that didn't change between games points at the rows already stored instead of copying them.
+    drop_records = ["DROP TABLE IF EXISTS Game_Pokemon;", "DROP TABLE IF EXISTS Stat_Record;", "DROP TABLE IF EXISTS Info_Record;"]
+    create_stat_record = '''
+        CREATE TABLE IF NOT EXISTS Stat_Record(
+            stat_hash TEXT PRIMARY KEY,
+            types TEXT NOT NULL,
+            type_mask INTEGER NOT NULL,
+            hp INTEGER,
+            attack INTEGER,
+            defense INTEGER,
+            special_attack INTEGER,
+            special_defense INTEGER,
+            speed INTEGER,
+            base_stat_total INTEGER
+        ) WITHOUT ROWID;
+    '''
+    create_info_record = '''
+        CREATE TABLE IF NOT EXISTS Info_Record(
+            info_hash TEXT PRIMARY KEY,
+            classification TEXT NOT NULL,
+            height TEXT NOT NULL,
+            weight TEXT NOT NULL,
+            gender_ratio TEXT NOT NULL,
+            height_m REAL,
+            weight_kg REAL,
+            male_ratio REAL,
+            female_ratio REAL
+        ) WITHOUT ROWID;
+    '''
+    create_game_pokemon = '''
+        CREATE TABLE IF NOT EXISTS Game_Pokemon(
+            game TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            name TEXT NOT NULL,
+            dex TEXT NOT NULL,
+            dex_number INTEGER,
+            stat_hash TEXT NOT NULL,
+            info_hash TEXT NOT NULL,
+            PRIMARY KEY (game, name_key),
+            FOREIGN KEY (stat_hash) REFERENCES Stat_Record(stat_hash),
+            FOREIGN KEY (info_hash) REFERENCES Info_Record(info_hash)
+        ) WITHOUT ROWID;
+    '''
+    #every game of one Pokemon is an index range on Game_Pokemon_Name.
+    #The hash indexes let records nobody points at any more be found and deleted without a scan.
+    create_game_pokemon_indexes = [
+        "CREATE INDEX IF NOT EXISTS Game_Pokemon_Name ON Game_Pokemon(name_key, game);",
+        "CREATE INDEX IF NOT EXISTS Game_Pokemon_Stat ON Game_Pokemon(stat_hash);",
+        "CREATE INDEX IF NOT EXISTS Game_Pokemon_Info ON Game_Pokemon(info_hash);",
+    ]
+    for statement in drop_records:
+        cur.execute(statement)
+    cur.execute(create_stat_record)
+    cur.execute(create_info_record)
+    cur.execute(create_game_pokemon)
+    for statement in create_game_pokemon_indexes:
+        cur.execute(statement)
+
+    #Pokemon_Sync remembers which cache entry (and which version of it) each row was loaded from, and which game it belongs to
+    drop_sync = '''
+        DROP TABLE IF EXISTS Pokemon_Sync;
+    '''
+    create_sync = '''
+        CREATE TABLE IF NOT EXISTS Pokemon_Sync(
+            url TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            content_hash TEXT NOT NULL,
+            game TEXT NOT NULL
+        );
+    '''
+    cur.execute(drop_sync)
+    cur.execute(create_sync)
+
+    #Pokedex_Meta holds a generation counter the loaders bump on every write, so readers can tell when their cached answers are stale
+    drop_meta = '''
+        DROP TABLE IF EXISTS Pokedex_Meta;
+    '''
+    create_meta = '''
+        CREATE TABLE IF NOT EXISTS Pokedex_Meta(
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    '''
+    cur.execute(drop_meta)
+    cur.execute(create_meta)
+    cur.execute("INSERT INTO Pokedex_Meta (key, value) VALUES ('generation', 0)")
+    cur.execute("PRAGMA user_version = " + str(SCHEMA_VERSION))
+
+    #commit changes and close the database
+    conn.commit()
+    if own_connection:
+        conn.close()
+    return
+
+def read_pokemon_rows(conn):
+    '''Read every Pokemon already stored in the database, whatever schema version it was built with
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+
+    Returns
+    -------
+    list
+        a list of dicts keyed like the attributes of a Pokemon instance. Empty if the tables don't exist.
+    '''
+    select_pokemon = '''
+        SELECT Pokemon.name, Pokemon_Extra.dex, Pokemon.types, Pokemon.hp, Pokemon.attack, Pokemon.defense,
+            Pokemon.special_attack, Pokemon.special_defense, Pokemon.speed, Pokemon.classification,
+            Pokemon_Extra.height, Pokemon_Extra.weight, Pokemon_Extra.gender_ratio
+        FROM Pokemon INNER JOIN Pokemon_Extra ON Pokemon.name=Pokemon_Extra.name
+    '''
+    try:
+        rows = conn.execute(select_pokemon).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    return [Pokemon(*row).toDict() for row in rows]
+
+def insert_pokemon_rows(conn, pokemon_dicts):
+    '''Insert or replace Pokemon in the Pokemon, Pokemon_Extra and Pokemon_Type tables, adjusting Type_Stats
+    by the difference between the old and new rows. A Pokemon is replaced by any row with the same name_key,
+    even if the name is spelled differently (e.g. a curly and a straight apostrophe). Does not commit.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+    pokemon_dicts: list
+        dicts keyed like the attributes of a Pokemon instance
+
+    Returns
+    -------
+    None
+    '''
+    #upsert on name_key: INSERT OR REPLACE on name would silently delete another row holding the same name_key
+    insert_pokemon = '''
+    INSERT INTO Pokemon (name, classification, types, hp, attack, defense, special_attack, special_defense, speed, name_key, type_mask, base_stat_total)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (name_key) DO UPDATE SET name = excluded.name, classification = excluded.classification, types = excluded.types,
+        hp = excluded.hp, attack = excluded.attack, defense = excluded.defense, special_attack = excluded.special_attack,
+        special_defense = excluded.special_defense, speed = excluded.speed, type_mask = excluded.type_mask, base_stat_total = excluded.base_stat_total
+'''
+    insert_pokemon_extra = '''
+    INSERT OR REPLACE INTO Pokemon_Extra (dex, height, weight, gender_ratio, name, dex_number, height_m, weight_kg, male_ratio, female_ratio)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+    #a name_key given twice ends up as its last version, like the upsert would leave it
+    pokemon_dicts = list(dict((normalize_name(p["name"]), p) for p in pokemon_dicts).values())
+    #older cache entries hold stats as text, so every stat goes through parse_stat on the way in
+    new_rows = []
+    for p in pokemon_dicts:
+        stats = [parse_stat(p[stat]) for stat in LEADERBOARD_STATS[:-1]]
+        total = None if None in stats else sum(stats)
+        new_rows.append((p["name"], types_to_mask(p["types"]), *stats, total))
+    #the rows being replaced are found by name_key, the same key the upsert replaces them by
+    old_rows = []
+    name_keys = [normalize_name(p["name"]) for p in pokemon_dicts]
+    for start in range(0, len(name_keys), POKEMON_READ_CHUNK):
+        chunk = name_keys[start:start + POKEMON_READ_CHUNK]
+        old_rows.extend(conn.execute("SELECT name, type_mask, " + ", ".join(LEADERBOARD_STATS) + " FROM Pokemon WHERE name_key IN (" + ", ".join("?" * len(chunk)) + ")", chunk).fetchall())
+    update_type_stats(conn, old_rows, new_rows)
+    conn.executemany(insert_pokemon, [[p["name"], p["classification"], p["types"], *row[2:8], normalize_name(p["name"]), row[1], row[8]] for (p, row) in zip(pokemon_dicts, new_rows)])
+    #a replaced row may have been stored under another spelling of the name, so its extra and type rows go too
+    replaced_names = set(row[0] for row in old_rows) - set(p["name"] for p in pokemon_dicts)
+    conn.executemany("DELETE FROM Pokemon_Extra WHERE name = ?", [(name,) for name in replaced_names])
+    #a reloaded Pokemon may have changed type, so its old type rows go first
+    conn.executemany("DELETE FROM Pokemon_Type WHERE name = ?", [(name,) for name in replaced_names | set(p["name"] for p in pokemon_dicts)])
+    conn.executemany("INSERT INTO Pokemon_Type (type, name, slot) VALUES (?, ?, ?)", [(type_name, p["name"], slot) for p in pokemon_dicts for (slot, type_name) in enumerate(parse_types(p["types"]), 1)])
+    conn.executemany(insert_pokemon_extra, [[p["dex"], p["height"], p["weight"], p["genderRatio"], p["name"], parse_dex_number(p["dex"]), parse_height(p["height"]), parse_weight(p["weight"]), *parse_gender_ratio(p["genderRatio"])] for p in pokemon_dicts])
+
+def update_type_stats(conn, old_rows, new_rows):
+    '''Take the old versions of some Pokemon out of Type_Stats and put the new versions in. Does not commit.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+    old_rows: list
+        (name, type_mask, *LEADERBOARD_STATS) rows being replaced
+    new_rows: list
+        (name, type_mask, *LEADERBOARD_STATS) rows replacing them, or new Pokemon
+
+    Returns
+    -------
+    None
+    '''
+    deltas = {}
+    for sign, rows in ((-1, old_rows), (1, new_rows)):
+        for row in rows:
+            for type_name in ["all"] + mask_types(row[1] or 0):
+                for stat, value in zip(LEADERBOARD_STATS, row[2:]):
+                    if value is None:
+                        continue
+                    delta = deltas.setdefault((type_name, stat), [0, 0.0, 0.0])
+                    delta[0] += sign
+                    delta[1] += sign * value
+                    delta[2] += sign * value * value
+    conn.executemany('''
+        INSERT INTO Type_Stats (type, stat, count, total, total_squares) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (type, stat) DO UPDATE SET count = count + excluded.count, total = total + excluded.total, total_squares = total_squares + excluded.total_squares
+    ''', [(type_name, stat, count, total, squares) for ((type_name, stat), (count, total, squares)) in deltas.items()])
+    conn.execute("DELETE FROM Type_Stats WHERE count <= 0")
+
+#what game_diff() compares, by the table the values are stored in
+DIFF_STAT_COLUMNS = ("types", "hp", "attack", "defense", "special_attack", "special_defense", "speed", "base_stat_total")
+DIFF_INFO_COLUMNS = ("classification", "height", "weight", "gender_ratio")
+
+def insert_game_rows(conn, game, pokemon_dicts):
+    '''Insert or replace Pokemon in the Game_Pokemon partition of one game. Stats and metadata are stored once per
+    distinct content in Stat_Record and Info_Record, and records no Pokemon points at any more are deleted. Does not commit.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+    game: string
+        Key of GAMES the Pokemon were scraped from
+    pokemon_dicts: list
+        dicts keyed like the attributes of a Pokemon instance
+
+    Returns
+    -------
+    None
+    '''
+    stat_records = {}
+    info_records = {}
+    partition_rows = {}
+    for p in pokemon_dicts:
+        stats = [parse_stat(p[stat]) for stat in LEADERBOARD_STATS[:-1]]
+        stat_record = (p["types"], types_to_mask(p["types"]), *stats, None if None in stats else sum(stats))
+        info_record = (p["classification"], p["height"], p["weight"], p["genderRatio"], parse_height(p["height"]), parse_weight(p["weight"]), *parse_gender_ratio(p["genderRatio"]))
+        stat_hash, info_hash = record_hash(stat_record), record_hash(info_record)
+        stat_records[stat_hash] = stat_record
+        info_records[info_hash] = info_record
+        name_key = normalize_name(p["name"])
+        partition_rows[name_key] = (game, name_key, p["name"], p["dex"], parse_dex_number(p["dex"]), stat_hash, info_hash)
+    #records the replaced rows pointed at may be left without a Pokemon once the new rows are in
+    old_hashes = []
+    name_keys = list(partition_rows)
+    for start in range(0, len(name_keys), POKEMON_READ_CHUNK):
+        chunk = name_keys[start:start + POKEMON_READ_CHUNK]
+        old_hashes.extend(conn.execute("SELECT stat_hash, info_hash FROM Game_Pokemon WHERE game = ? AND name_key IN (" + ", ".join("?" * len(chunk)) + ")", [game, *chunk]).fetchall())
+    conn.executemany("INSERT OR IGNORE INTO Stat_Record (stat_hash, types, type_mask, hp, attack, defense, special_attack, special_defense, speed, base_stat_total) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(stat_hash, *record) for (stat_hash, record) in stat_records.items()])
+    conn.executemany("INSERT OR IGNORE INTO Info_Record (info_hash, classification, height, weight, gender_ratio, height_m, weight_kg, male_ratio, female_ratio) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(info_hash, *record) for (info_hash, record) in info_records.items()])
+    conn.executemany("INSERT OR REPLACE INTO Game_Pokemon (game, name_key, name, dex, dex_number, stat_hash, info_hash) VALUES (?, ?, ?, ?, ?, ?, ?)", list(partition_rows.values()))
+    conn.executemany("DELETE FROM Stat_Record WHERE stat_hash = ? AND NOT EXISTS (SELECT 1 FROM Game_Pokemon WHERE stat_hash = ?)",
+        [(stat_hash, stat_hash) for stat_hash in set(row[0] for row in old_hashes) - set(stat_records)])
+    conn.executemany("DELETE FROM Info_Record WHERE info_hash = ? AND NOT EXISTS (SELECT 1 FROM Game_Pokemon WHERE info_hash = ?)",
+        [(info_hash, info_hash) for info_hash in set(row[1] for row in old_hashes) - set(info_records)])
+
+def game_diff(conn, name, first_game, second_game):
+    '''What changed for one Pokemon between two games. Both partition rows are key lookups on (game, name_key),
+    and stats or metadata with the same hash in both games are known to be equal without being read.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+    name: string
+        Pokemon name, in any capitalization
+    first_game: string
+        Key of GAMES to compare from
+    second_game: string
+        Key of GAMES to compare to
+
+    Returns
+    -------
+    dict
+        field -> (value in first_game, value in second_game) for every field that differs. Empty when nothing changed.
+
+    Raises LookupError when the Pokemon isn't stored for one of the games, and ValueError for an unknown game.
+    '''
+    check_game(first_game)
+    check_game(second_game)
+    rows = dict((row[0], row[1:]) for row in conn.execute("SELECT game, dex, stat_hash, info_hash FROM Game_Pokemon WHERE name_key = ? AND game IN (?, ?)", (normalize_name(name), first_game, second_game)))
+    for game in (first_game, second_game):
+        if game not in rows:
+            raise LookupError(name + " is not stored for " + GAMES[game].title)
+    first, second = rows[first_game], rows[second_game]
+    changes = {}
+    if first[0] != second[0]:
+        changes["dex"] = (first[0], second[0])
+    for table, key, columns, position in (("Stat_Record", "stat_hash", DIFF_STAT_COLUMNS, 1), ("Info_Record", "info_hash", DIFF_INFO_COLUMNS, 2)):
+        if first[position] == second[position]:
+            continue
+        query = "SELECT " + ", ".join(columns) + " FROM " + table + " WHERE " + key + " = ?"
+        old_values = conn.execute(query, (first[position],)).fetchone()
+        new_values = conn.execute(query, (second[position],)).fetchone()
+        for column, old_value, new_value in zip(columns, old_values, new_values):
+            if old_value != new_value:
+                changes[column] = (old_value, new_value)
+    return changes
+
+def game_changes(conn, first_game, second_game):
+    '''Names of the Pokemon stored for both games whose stats or metadata differ, in dex order.
+    Only the record hashes are compared, so no stat or metadata row is read.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+    first_game: string
+        Key of GAMES to compare from
+    second_game: string
+        Key of GAMES to compare to
+
+    Returns
+    -------
+    list
+        Pokemon names
+    '''
+    check_game(first_game)
+    check_game(second_game)
+    query = '''
+        SELECT first.name FROM Game_Pokemon AS first
+        INNER JOIN Game_Pokemon AS second ON second.game = ? AND second.name_key = first.name_key
+        WHERE first.game = ? AND (first.stat_hash != second.stat_hash OR first.info_hash != second.info_hash)
+        ORDER BY first.dex_number
+    '''
+    return [row[0] for row in conn.execute(query, (second_game, first_game))]
+
+def game_storage(conn):
+    '''How many Pokemon each game's partition holds, and how many distinct stat and metadata records they share
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+
+    Returns
+    -------
+    dict
+        {"games": {game: number of Pokemon}, "stat_records": integer, "info_records": integer}
+    '''
+    return {
+        "games": dict(conn.execute("SELECT game, COUNT(*) FROM Game_Pokemon GROUP BY game").fetchall()),
+        "stat_records": conn.execute("SELECT COUNT(*) FROM Stat_Record").fetchone()[0],
+        "info_records": conn.execute("SELECT COUNT(*) FROM Info_Record").fetchone()[0],
+    }
+
+def configure_connection(conn):
+    '''Tune a PokemonData connection for bulk loading: write-ahead logging so readers never block the loader,
+    fewer fsyncs per commit, and temporary tables and a larger page cache kept in memory.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+
+    Returns
+    -------
+    None
+    '''
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-8000")
+
+def open_database(filename=DATABASE_FILENAME):
+    '''Open PokemonData, migrating it in place if it was built with an older schema.
+    Nothing is downloaded, so this is cheap and works offline.
+
+    Parameters
+    ----------
+    filename: string
+        Path of the SQLite database
+
+    Returns
+    -------
+    sqlite3.Connection
+        an open connection. The caller is responsible for closing it.
+    '''
+    conn = sqlite3.connect(filename)
+    configure_connection(conn)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != SCHEMA_VERSION:
+        #rows already in the old tables are carried over so an upgrade never needs the network
+        existing_rows = read_pokemon_rows(conn)
+        if existing_rows:
+            print("Upgrading database from schema version " + str(version) + " to " + str(SCHEMA_VERSION))
+        make_pokemon_data_table(conn)
+        insert_pokemon_rows(conn, existing_rows)
+        #the Pokemon tables always held DEFAULT_GAME, so they seed its partition
+        insert_game_rows(conn, DEFAULT_GAME, existing_rows)
+        conn.commit()
+    return conn
+
+def content_hash(cached_value):
+    '''Hash of a cached entry, used to tell whether the database already holds this exact version of it
+
+    Parameters
+    ----------
+    cached_value: string
+        The entry as stored in the cache
+
+    Returns
+    -------
+    string
+        hex digest
+    '''
+    return hashlib.sha1(cached_value.encode("utf-8")).hexdigest()
+
+def record_hash(values):
+    '''Content address of a Stat_Record or Info_Record row: the hash of its values, so equal rows always get the same key'''
+    return content_hash(json.dumps(values))
+
+def bump_generation(conn):
+    '''Mark the Pokemon tables as changed. Call inside the transaction that changed them.'''
+    conn.execute("UPDATE Pokedex_Meta SET value = value + 1 WHERE key = 'generation'")
+
+def data_generation(conn):
+    '''Counter that goes up every time a loader writes to the Pokemon tables
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+
+    Returns
+    -------
+    integer
+    '''
+    return conn.execute("SELECT value FROM Pokedex_Meta WHERE key = 'generation'").fetchone()[0]
+
+def load_cache_into_database(conn=None, cache_entries=None):
+    '''Load cache entries into both the Pokemon and Pokemon_Extra tables in a single transaction.
+    The cache is read once and entries whose content hash matches the row already loaded are skipped
+    without being decoded. Every entry also goes into the Game_Pokemon partition of the game its url
+    belongs to, while only DEFAULT_GAME entries go into the Pokemon tables. Entries whose url is outside
+    every Pokedex in GAMES are skipped.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData. A new connection is opened (and closed) when None.
+    cache_entries: iterable
+        (url, cached_value, fetched_at) tuples. Defaults to every entry in the cache. Values are JSON text,
+        or already decoded dicts (e.g. from PackedCache.entries()).
+
+    Returns
+    -------
+    dict
+        number of Pokemon "inserted", "updated" and "skipped"
+    '''
+    own_connection = conn is None
+    if own_connection:
+        conn = open_database()
+    if cache_entries is None:
+        cache_entries = open_cache().entries()
+    counts = {"inserted": 0, "updated": 0, "skipped": 0}
+    loaded_hashes = dict(conn.execute("SELECT url, content_hash FROM Pokemon_Sync").fetchall())
+    known_names = set(row[0] for row in conn.execute("SELECT name FROM Pokemon"))
+    changed_pokemon = []
+    changed_by_game = {}
+    sync_rows = []
+    for url, cached_value, fetched_at in cache_entries:
+        pokemon_dict = None
+        if not isinstance(cached_value, str):
+            #decoded entries hash like the JSON text they came from
+            pokemon_dict, cached_value = cached_value, json.dumps(cached_value)
+        entry_hash = content_hash(cached_value)
+        game = game_of_url(url)
+        if game is None or loaded_hashes.get(url) == entry_hash:
+            counts["skipped"] += 1
+            continue
+        if pokemon_dict is None:
+            pokemon_dict = json.loads(cached_value)
+        if url in loaded_hashes or (game == DEFAULT_GAME and pokemon_dict["name"] in known_names):
+            counts["updated"] += 1
+        else:
+            counts["inserted"] += 1
+        if game == DEFAULT_GAME:
+            known_names.add(pokemon_dict["name"])
+            changed_pokemon.append(pokemon_dict)
+        changed_by_game.setdefault(game, []).append(pokemon_dict)
+        sync_rows.append((url, pokemon_dict["name"], fetched_at, entry_hash, game))
+    #one transaction (and one commit) for the whole batch
+    PROFILER.count("database rows written", len(sync_rows))
+    if sync_rows:
+        with PROFILER.stage("database write"), conn:
+            insert_pokemon_rows(conn, changed_pokemon)
+            for game, pokemon_dicts in changed_by_game.items():
+                insert_game_rows(conn, game, pokemon_dicts)
+            conn.executemany("INSERT OR REPLACE INTO Pokemon_Sync (url, name, fetched_at, content_hash, game) VALUES (?, ?, ?, ?, ?)", sync_rows)
+            bump_generation(conn)
+    if own_connection:
+        conn.close()
+    return counts
+
+def store_pokemon_in_database1():
+    '''Store static pokemon data into the first establised SQLite Table.
+    Both tables are now written together by load_cache_into_database().'''
+    return load_cache_into_database()
+
+def store_pokemon_in_database2():
+    '''Store static extra pokemon data into the second establised SQLite Table.
+    Both tables are now written together by load_cache_into_database(), which store_pokemon_in_database1() already ran,
+    so this does nothing. It is kept so the old store_pokemon_in_database1(), store_pokemon_in_database2() sequence still works.'''
+    return {"inserted": 0, "updated": 0, "skipped": 0}
+
+def print_load_report(counts):
+    '''Print the row counts returned by load_cache_into_database()'''
+    print("Database loaded: " + str(counts["inserted"]) + " inserted, " + str(counts["updated"]) + " updated, " + str(counts["skipped"]) + " unchanged")
+
+
+#########################################################
+######ADDING ITEMS TO THE DATABASE IN SQL################
+#########################################################
+#crawl outcomes recorded per url
+CRAWL_PENDING = "pending"
+CRAWL_OK = "ok"
+CRAWL_NOT_IN_GAME = "not-in-game"
+CRAWL_FAILED = "failed"
+#a url that failed this many times is left alone until its failures are reset (CrawlJob.reset_failed, --retry-failed)
+CRAWL_MAX_ATTEMPTS = 3
+
+class CrawlJob:
+    '''Resumable crawl over the whole name to url dictionary
+
+    The outcome of every url (pending, ok, not-in-game, or failed with an attempt count) is committed
+    to the Crawl_State table of the cache file as soon as its page is handled, so an interrupted crawl
+    picks up exactly where it stopped.
+
+    Instance Attributes
+    --------------
+    conn: sqlite3.Connection
+    Connection to the cache file holding Crawl_State
+
+    max_attempts: integer
+    Failed urls are retried until they have failed this many times
+    '''
+
+    def __init__(self, filename=CACHE_DB_FILENAME, max_attempts=CRAWL_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(filename)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS Crawl_State(
+                url TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL
+            )
+        ''')
+        self.conn.commit()
+
+    def seed(self, pokemon_dictionary):
+        '''Add every url of the name to url dictionary as pending, keeping the state of urls already known.
+        position is the 1-based place of the Pokemon in the dictionary (dex order).'''
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO Crawl_State (url, position, name, status) VALUES (?, ?, ?, ?)",
+                [(url, position, name, CRAWL_PENDING) for (position, (name, url)) in enumerate(pokemon_dictionary.items(), 1)])
+
+    def todo(self, first=None, last=None, base_url=None):
+        '''urls in positions first..last (inclusive) that may still need to be fetched, in dex order.
+        Pokemon recorded as not in the game are included so the caller can recheck them once their
+        negative cache entry expires. Only urls starting with base_url (one game's Pokedex) when it is given.'''
+        query = "SELECT url, name FROM Crawl_State WHERE (status IN (?, ?) OR (status = ? AND attempts < ?))"
+        params = [CRAWL_PENDING, CRAWL_NOT_IN_GAME, CRAWL_FAILED, self.max_attempts]
+        if base_url is not None:
+            query += " AND substr(url, 1, ?) = ?"
+            params.extend([len(base_url), base_url])
+        if first is not None:
+            query += " AND position >= ?"
+            params.append(first)
+        if last is not None:
+            query += " AND position <= ?"
+            params.append(last)
+        return self.conn.execute(query + " ORDER BY position", params).fetchall()
+
+    def reset_failed(self, base_url=None):
+        '''Give every failed url its attempts back, so the next todo() includes the ones that had given up.
+        Only urls starting with base_url when it is given. Returns how many urls were reset.'''
+        query = "UPDATE Crawl_State SET status = ?, attempts = 0, error = NULL WHERE status = ?"
+        params = [CRAWL_PENDING, CRAWL_FAILED]
+        if base_url is not None:
+            query += " AND substr(url, 1, ?) = ?"
+            params.extend([len(base_url), base_url])
+        with self.conn:
+            return self.conn.execute(query, params).rowcount
+
+    def record(self, url, status, error=None):
+        '''Commit the outcome of one url'''
+        with self.conn:
+            self.conn.execute("UPDATE Crawl_State SET status = ?, attempts = attempts + ?, error = ?, updated_at = ? WHERE url = ?",
+                (status, 1 if status == CRAWL_FAILED else 0, error, time.time(), url))
+
+    def summary(self, base_url=None):
+        '''number of urls in each state, counting only urls starting with base_url when it is given'''
+        if base_url is None:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM Crawl_State GROUP BY status").fetchall())
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM Crawl_State WHERE substr(url, 1, ?) = ? GROUP BY status", (len(base_url), base_url)).fetchall())
+
+    def close(self):
+        self.conn.close()
+
+
+def run_crawl(first=None, last=None, limit=None, report_every=10, game=DEFAULT_GAME, retry_failed=False, stand_in=None):
+    '''Crawl Serebii for every Pokemon of the name to url dictionary that hasn't been handled yet, caching each page
+    as it arrives and loading the results into the database at the end. Safe to interrupt with Ctrl-C and run again.
+    Each game is crawled, and resumed, separately.
+
+    Parameters
+    ----------
+    first: integer
+        First dex position to crawl (1-based). From the start when None.
+    last: integer
+        Last dex position to crawl, inclusive. To the end when None.
+    limit: integer
+        Most pages handled by this run. No limit when None.
+    report_every: integer
+        Print progress after this many pages
+    game: string
+        Key of GAMES whose Pokedex is crawled
+    retry_failed: bool
+        Reset the attempts of urls that failed before, including those that failed CRAWL_MAX_ATTEMPTS times
+    stand_in: string
+        Base url of a local server serving the game's pages in place of Serebii (see add_stand_in()).
+        Pages are still cached and loaded under the game's own urls.
+
+    Returns
+    -------
+    dict
+        number of urls of the game in each state once the run stops
+    '''
+    game_dex = GAMES[check_game(game)]
+    if stand_in is not None:
+        add_stand_in(stand_in, game)
+    base_url = game_dex.base_url
+    pokemon_dictionary = get_pokemon_dictionary(game)
+    job = CrawlJob()
+    job.seed(pokemon_dictionary)
+    if retry_failed:
+        print("Retrying " + str(job.reset_failed(base_url)) + " failed pages")
+    todo = job.todo(first, last, base_url)
+    cache = open_cache()
+    #pages cached by earlier runs (or by the prompt), and pages known to be missing, don't need fetching again
+    to_fetch = []
+    for url, name in todo:
+        if url in cache:
+            job.record(url, CRAWL_OK)
+        elif cache.absent(url) is not None:
+            job.record(url, CRAWL_NOT_IN_GAME)
+        else:
+            to_fetch.append(url)
+    if limit is not None:
+        to_fetch = to_fetch[:limit]
+    print("Crawling " + str(len(to_fetch)) + " " + game_dex.title + " pages (" + str(len(todo) - len(to_fetch)) + " already known or over the limit)")
+    handled = 0
+    fetched_bytes = 0
+    start = time.monotonic()
+    try:
+        for url, page_text, error in get_crawler().crawl(to_fetch):
+            if error is None:
+                fetched_bytes += len(page_text)
+                try:
+                    cache[url] = game_dex.read_page(page_text)[1].toJson()
+                except Exception as parse_error:
+                    error = parse_error
+            if error is None:
+                job.record(url, CRAWL_OK)
+            elif absent_reason(error) is None:
+                job.record(url, CRAWL_FAILED, str(error))
+            else:
+                cache.mark_absent(url, absent_reason(error), str(error))
+                job.record(url, CRAWL_NOT_IN_GAME, str(error))
+            handled += 1
+            if handled % report_every == 0 or handled == len(to_fetch):
+                elapsed = max(time.monotonic() - start, 1e-9)
+                rate = handled / elapsed
+                remaining = (len(to_fetch) - handled) / rate
+                print("[" + str(handled) + "/" + str(len(to_fetch)) + "] " + format(rate, ".1f") + " pages/s, " + format(fetched_bytes / elapsed / 1024, ".0f") + " KB/s, about " + format(remaining, ".0f") + "s left")
+    except KeyboardInterrupt:
+        print("Crawl interrupted after " + str(handled) + " pages. Run it again to resume.")
+    finally:
+        summary = job.summary(base_url)
+        job.close()
+        if stand_in is not None:
+            remove_stand_in(stand_in)
+        print("Crawl state: " + ", ".join(status + " " + str(count) for (status, count) in sorted(summary.items())))
+        print_load_report(load_cache_into_database())
+    return summary
+
+def section_hash(page_text, game=DEFAULT_GAME):
+    '''Hash of the parts of a Serebii page a Pokemon is built from (the info cells, types and base stats), so
+    changes anywhere else on the page (ads, navigation, comments) don't count as changes to the Pokemon
+
+    Parameters
+    ----------
+    page_text: string
+        The html of a Pokemon Dex page in Serebii.net
+    game: string
+        Key of GAMES whose read_page() reads the page
+
+    Returns
+    -------
+    tuple
+        (hex digest, the Pokemon instance built from the page)
+    '''
+    #same backend and html.parser fallback as parse_pokemon_page(). Both backends extract identical sections, so the hash doesn't depend on which one read the page.
+    sections, pokemon = GAMES[game].read_page(page_text)
+    return content_hash(json.dumps(sections)), pokemon
+
+def run_refresh(max_age=0, limit=None, report_every=25):
+    '''Revalidate cached Pokemon against Serebii and re-store only the ones whose page content changed.
+    Pages are asked for with If-None-Match / If-Modified-Since when an earlier check saved an ETag or
+    Last-Modified header, so unchanged pages come back as an empty 304. Full pages are compared by
+    section_hash() and only re-stored when the hash moved. The database is updated at the end.
+
+    Parameters
+    ----------
+    max_age: float
+        Only revalidate entries last checked more than this many seconds ago. 0 checks everything.
+    limit: integer
+        Most pages checked by this run, oldest checked first. No limit when None.
+    report_every: integer
+        Print progress after this many pages
+
+    Returns
+    -------
+    dict
+        number of pages "not_modified" (304), "unchanged" (same section hash), "changed", "failed",
+        and the "bytes" downloaded
+    '''
+    cache = open_cache()
+    crawler = get_crawler()
+    validators = cache.validators()
+    now = time.time()
+    never_checked = (None, None, None, 0.0)
+    due = [url for url in cache if now - validators.get(url, never_checked)[3] >= max_age]
+    due.sort(key=lambda url: validators.get(url, never_checked)[3])
+    if limit is not None:
+        due = due[:limit]
+    print("Revalidating " + str(len(due)) + " cached pages")
+    counts = {"not_modified": 0, "unchanged": 0, "changed": 0, "failed": 0, "bytes": 0}
+    checked_rows = []
+    handled = 0
+    try:
+        for url, result, error in crawler.crawl(due, lambda url: crawler.revalidate(url, *validators.get(url, never_checked)[:2])):
+            handled += 1
+            if error is not None:
+                #the cached entry stays as it is and keeps its old check time, so it is first in line next run
+                counts["failed"] += 1
+                continue
+            page_text, etag, last_modified, received = result
+            counts["bytes"] += received
+            previous_hash = validators.get(url, never_checked)[2]
+            if page_text is None:
+                counts["not_modified"] += 1
+                checked_rows.append((url, etag, last_modified, previous_hash, time.time()))
+                continue
+            try:
+                new_hash, pokemon = section_hash(page_text, game_of_url(url) or DEFAULT_GAME)
+                if new_hash == previous_hash:
+                    counts["unchanged"] += 1
+                else:
+                    refreshed = pokemon.toJson()
+                    #entries checked for the first time have no hash yet, so their content decides
+                    if refreshed == cache.get(url):
+                        counts["unchanged"] += 1
+                    else:
+                        cache[url] = refreshed
+                        counts["changed"] += 1
+            except Exception:
+                counts["failed"] += 1
+                continue
+            checked_rows.append((url, etag, last_modified, new_hash, time.time()))
+            if handled % report_every == 0:
+                print("[" + str(handled) + "/" + str(len(due)) + "] " + str(counts["changed"]) + " changed, " + format(counts["bytes"] / 1024, ".0f") + " KB downloaded")
+    except KeyboardInterrupt:
+        print("Refresh interrupted after " + str(handled) + " pages.")
+    finally:
+        cache.set_validators(checked_rows)
+        print("Refresh: " + str(counts["not_modified"]) + " not modified, " + str(counts["unchanged"]) + " unchanged, " + str(counts["changed"]) + " changed, " + str(counts["failed"]) + " failed, " + format(counts["bytes"] / 1024, ".0f") + " KB downloaded")
+        if counts["changed"]:
+            print_load_report(load_cache_into_database())
+    return counts
+
+def adding_first_151_to_database():
+    'Adds the first 151 Pokemon to the SQL Database PokemonData. Will skip over Pokemon in the first 151 that are not currently added to Sword and Shield'
+    #the first 151 are a resumable crawl over dex positions 1 to 151. Pokemon already cached or known to be missing are skipped.
+    print("Establishing Database...")
+    run_crawl(1, 151)
+    return
+
+def sync_database(allow_network=True):
+    '''Bring PokemonData up to date before the prompt appears.
+    Cached entries that are missing or stale in the database are loaded without touching the network.
+    Serebii is only crawled while the first 151 are still incomplete.
+
+    Parameters
+    ----------
+    allow_network: bool
+        Whether an incomplete database may be filled by crawling Serebii
+
+    Returns
+    -------
+    None
+    '''
+    conn = open_database()
+    counts = load_cache_into_database(conn)
+    if counts["inserted"] or counts["updated"]:
+        print_load_report(counts)
+    pokemon_count = conn.execute("SELECT COUNT(*) FROM Pokemon").fetchone()[0]
+    conn.close()
+    if pokemon_count < FIRST_151_IN_GAME and allow_network:
+        try:
+            adding_first_151_to_database()
+        except requests.RequestException:
+            print("[Error] Could not reach the Pokedex sites. Continuing with the " + str(pokemon_count) + " Pokemon already in the database.")
+    return
+
+#########################################################
+######QUERYING THE DATABASE##############################
+#########################################################
+
+def normalize_name(name):
+    '''Turn a typed or scraped Pokemon name into the lookup key stored in Pokemon.name_key.
+    Case, surrounding spaces, repeated spaces and curly apostrophes don't matter, so "mr.  MIME" finds Mr. Mime.
+
+    Parameters
+    ----------
+    name: string
+        The Pokemon name
+
+    Returns
+    -------
+    string
+        the normalized lookup key
+    '''
+    return " ".join(name.replace("’", "'").lower().split())
+
+class PokedexQuery:
+    '''Point lookups against PokemonData over one long-lived connection
+
+    Lookups go through the unique index on Pokemon.name_key and the index on Pokemon_Extra.name,
+    so they cost the same whether the table holds 110 Pokemon or the whole dex. The query strings
+    never change, so sqlite keeps them prepared in the connection's statement cache.
+
+    Instance Attributes
+    --------------
+    conn: sqlite3.Connection
+    The open connection to PokemonData
+    '''
+
+    #column order matches the original SELECT * join so row indexes used by the stat views stay the same.
+    #the numeric height_m and weight_kg follow at indexes 14 and 15
+    LOOKUP_QUERY = '''
+        SELECT Pokemon.name, Pokemon.classification, Pokemon.types, Pokemon.hp, Pokemon.attack, Pokemon.defense,
+            Pokemon.special_attack, Pokemon.special_defense, Pokemon.speed,
+            Pokemon_Extra.dex, Pokemon_Extra.height, Pokemon_Extra.weight, Pokemon_Extra.gender_ratio, Pokemon_Extra.name,
+            Pokemon_Extra.height_m, Pokemon_Extra.weight_kg
+        FROM Pokemon INNER JOIN Pokemon_Extra ON Pokemon.name=Pokemon_Extra.name
+        WHERE Pokemon.name_key = ?
+    '''
+
+    def __init__(self, filename=DATABASE_FILENAME):
+        self.conn = open_database(filename)
+
+    def lookup(self, name):
+        '''Find one Pokemon by name
+
+        Parameters
+        ----------
+        name: string
+            The Pokemon name, in any case
+
+        Returns
+        -------
+        tuple
+            the joined Pokemon and Pokemon_Extra row, or None if the Pokemon isn't in the database
+        '''
+        with PROFILER.stage("database lookup"):
+            return self.conn.execute(self.LOOKUP_QUERY, (normalize_name(name),)).fetchone()
+
+    def close(self):
+        self.conn.close()
+
+class PokedexFrame:
+    '''Column-oriented, in-memory copy of the whole Pokedex for bulk stat queries
+
+    Every numeric column is a NumPy array, so filters and sorts run as vectorized operations
+    instead of looping over Pokemon objects. Frames are immutable; where() and sort_by()
+    return new frames.
+
+    e.g. the fastest Pokemon sorted by attack:
+        frame = PokedexFrame.load()
+        fast = frame.where(frame["speed"] > 100).sort_by("attack")
+
+    Instance Attributes
+    --------------
+    columns: dict
+    Maps a column name to its NumPy array. Text columns use dtype object, numeric columns
+    are float64 with NaN for missing values (e.g. the gender ratios of genderless Pokemon).
+    '''
+
+    TEXT_COLUMNS = ("name", "classification", "types")
+    INTEGER_COLUMNS = ("hp", "attack", "defense", "special_attack", "special_defense", "speed", "dex_number")
+    NUMERIC_COLUMNS = ("hp", "attack", "defense", "special_attack", "special_defense", "speed", "dex_number", "height_m", "weight_kg", "male_ratio", "female_ratio")
+    LOAD_QUERY = '''
+        SELECT Pokemon.name, Pokemon.classification, Pokemon.types, Pokemon.hp, Pokemon.attack, Pokemon.defense,
+            Pokemon.special_attack, Pokemon.special_defense, Pokemon.speed, Pokemon_Extra.dex_number,
+            Pokemon_Extra.height_m, Pokemon_Extra.weight_kg, Pokemon_Extra.male_ratio, Pokemon_Extra.female_ratio
+        FROM Pokemon INNER JOIN Pokemon_Extra ON Pokemon.name=Pokemon_Extra.name
+        ORDER BY Pokemon_Extra.dex_number
+    '''
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def load(cls, conn=None):
+        '''Read every Pokemon in the database with a single query
+
+        Parameters
+        ----------
+        conn: sqlite3.Connection
+            Connection to PokemonData. A new connection is opened (and closed) when None.
+
+        Returns
+        -------
+        PokedexFrame
+        '''
+        own_connection = conn is None
+        if own_connection:
+            conn = open_database()
+        rows = conn.execute(cls.LOAD_QUERY).fetchall()
+        if own_connection:
+            conn.close()
+        names = cls.TEXT_COLUMNS + cls.NUMERIC_COLUMNS
+        #transpose the rows into one sequence per column
+        values = list(zip(*rows)) if rows else [()] * len(names)
+        columns = {}
+        for i, name in enumerate(names):
+            if name in cls.TEXT_COLUMNS:
+                columns[name] = np.array(values[i], dtype=object)
+            else:
+                columns[name] = np.array([np.nan if value is None else value for value in values[i]], dtype=np.float64)
+        return cls(columns)
+
+    def __len__(self):
+        return len(self.columns["name"])
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def where(self, mask):
+        '''Keep the rows where mask is True
+
+        Parameters
+        ----------
+        mask: numpy array of bools, or of row positions
+            e.g. frame["speed"] > 100
+
+        Returns
+        -------
+        PokedexFrame
+        '''
+        return PokedexFrame(dict((name, column[mask]) for (name, column) in self.columns.items()))
+
+    def sort_by(self, column, descending=True):
+        '''Order the rows by one column. Missing values go last.
+
+        Parameters
+        ----------
+        column: string
+            The column to sort on
+        descending: bool
+            Largest values first when True
+
+        Returns
+        -------
+        PokedexFrame
+        '''
+        keys = self.columns[column]
+        if keys.dtype == object:
+            order = np.argsort(keys.astype(str), kind="stable")
+            if descending:
+                order = order[::-1]
+        elif descending:
+            #negating keeps NaN at the end while flipping the order
+            order = np.argsort(-keys, kind="stable")
+        else:
+            order = np.argsort(keys, kind="stable")
+        return self.where(order)
+
+    def to_dicts(self):
+        '''The rows of the frame as a list of dicts, with stats back as integers and NaN as None'''
+        rows = []
+        for i in range(len(self)):
+            row = {}
+            for name, column in self.columns.items():
+                value = column[i]
+                if name in self.TEXT_COLUMNS:
+                    row[name] = value
+                elif np.isnan(value):
+                    row[name] = None
+                elif name in self.INTEGER_COLUMNS:
+                    row[name] = int(value)
+                else:
+                    row[name] = float(value)
+            rows.append(row)
+        return rows
+
+def read_changed_pokemon(conn, known_hashes, columns):
+    '''Find the Pokemon rows that changed since an in-memory index last read them, by comparing Pokemon_Sync content hashes
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+    known_hashes: dict
+        name -> content hash of every Pokemon the index holds (the hashes returned by the previous call)
+    columns: tuple
+        Pokemon columns to read for the changed rows, after the name
+
+    Returns
+    -------
+    tuple
+        (name -> content hash of every Pokemon now, rows (name, *columns) of new or changed Pokemon, names of removed Pokemon)
+    '''
+    #Pokemon loaded before Pokemon_Sync existed have no hash and are read on the first call only
+    hashes = dict(conn.execute("SELECT Pokemon.name, Pokemon_Sync.content_hash FROM Pokemon LEFT JOIN Pokemon_Sync ON Pokemon_Sync.name = Pokemon.name AND Pokemon_Sync.game = ?", (DEFAULT_GAME,)).fetchall())
+    changed = [name for (name, entry_hash) in hashes.items() if name not in known_hashes or entry_hash != known_hashes[name]]
+    removed = [name for name in known_hashes if name not in hashes]
+    rows = []
+    for start in range(0, len(changed), POKEMON_READ_CHUNK):
+        chunk = changed[start:start + POKEMON_READ_CHUNK]
+        query = "SELECT name, " + ", ".join(columns) + " FROM Pokemon WHERE name IN (" + ", ".join("?" * len(chunk)) + ")"
+        rows.extend(conn.execute(query, chunk).fetchall())
+    return hashes, rows, removed
+
+class SimilarityIndex:
+    '''Nearest-neighbour search over the six base stats of every Pokemon in the database
+
+    Stats are kept in one NumPy matrix with a row per Pokemon. refresh() only re-reads the rows whose
+    content hash in Pokemon_Sync changed since the last refresh, and does nothing at all while the
+    data generation stays the same, so it is cheap to call before every query.
+
+    Two distances are supported:
+        "euclidean" - Euclidean distance between stat vectors scaled to mean 0 and standard deviation 1
+                      per stat, so speed counts as much as hp
+        "cosine"    - 1 - cosine similarity of the raw stat vectors, which compares the shape of the stat
+                      spread whatever the base stat total
+
+    A stat that is NULL in the database is filled in with the mean of that stat over the Pokemon that have it,
+    so the Pokemon stays searchable and is compared on the stats it does have. The mean lands at 0 after
+    scaling, where a missing stat moves the Pokemon towards no one in particular; a 0 stat would have made
+    it look like the weakest Pokemon in that stat.
+
+    e.g. the five Pokemon with stats most like Pikachu's:
+        get_similarity_index().neighbours("pikachu", k=5)
+
+    Instance Attributes
+    --------------
+    names: list
+    Pokemon names, one per matrix row
+
+    type_masks: list
+    type mask (see TYPE_BITS) of each row, for type filters
+
+    stats: numpy array
+    float64 matrix of shape (number of Pokemon, 6) in STAT_COLUMNS order, NaN where a stat is missing
+    '''
+
+    STAT_COLUMNS = ("hp", "attack", "defense", "special_attack", "special_defense", "speed")
+    METRICS = ("euclidean", "cosine")
+
+    def __init__(self):
+        self.names = []
+        self.type_masks = []
+        self.stats = np.zeros((0, len(self.STAT_COLUMNS)), dtype=np.float64)
+        self._rows = {}
+        self._keys = {}
+        self._hashes = {}
+        self._generation = None
+        self._lock = threading.Lock()
+        self._scaled = self.stats
+        self._unit = self.stats
+
+    def refresh(self, conn=None):
+        '''Bring the matrix up to date with the Pokemon table
+
+        Parameters
+        ----------
+        conn: sqlite3.Connection
+            Connection to PokemonData. A new connection is opened (and closed) when None.
+
+        Returns
+        -------
+        integer
+            number of rows added, changed or removed
+        '''
+        own_connection = conn is None
+        if own_connection:
+            conn = open_database()
+        try:
+            with self._lock:
+                generation = data_generation(conn)
+                if generation == self._generation:
+                    return 0
+                self._hashes, changed, removed = read_changed_pokemon(conn, self._hashes, ("type_mask",) + self.STAT_COLUMNS)
+                if removed:
+                    self._remove(removed)
+                self._store(changed)
+                self._generation = generation
+                if changed or removed:
+                    self._rescale()
+                return len(changed) + len(removed)
+        finally:
+            if own_connection:
+                conn.close()
+
+    def _remove(self, removed):
+        drop = sorted(self._rows[name] for name in removed)
+        self.stats = np.delete(self.stats, drop, axis=0)
+        for position in reversed(drop):
+            del self.names[position]
+            del self.type_masks[position]
+        self._rows = dict((name, position) for (position, name) in enumerate(self.names))
+        self._keys = dict((normalize_name(name), position) for (position, name) in enumerate(self.names))
+
+    #overwrites the rows of Pokemon already indexed and appends the new ones
+    def _store(self, rows):
+        new_stats = []
+        for row in rows:
+            name, type_mask, values = row[0], row[1], [np.nan if value is None else value for value in row[2:]]
+            if name in self._rows:
+                self.stats[self._rows[name]] = values
+                self.type_masks[self._rows[name]] = type_mask
+            else:
+                self._rows[name] = len(self.names)
+                self._keys[normalize_name(name)] = len(self.names)
+                self.names.append(name)
+                self.type_masks.append(type_mask)
+                new_stats.append(values)
+        if new_stats:
+            self.stats = np.vstack([self.stats, np.array(new_stats, dtype=np.float64)])
+
+    #precomputes the per-stat scaled matrix for euclidean and the unit rows for cosine
+    def _rescale(self):
+        #missing stats (NaN) take the mean of their column, or 0 when no Pokemon has that stat
+        present = ~np.isnan(self.stats)
+        counts = present.sum(axis=0)
+        means = np.where(counts > 0, np.where(present, self.stats, 0.0).sum(axis=0) / np.maximum(counts, 1), 0.0)
+        stats = np.where(present, self.stats, means)
+        spread = stats.std(axis=0)
+        spread[spread == 0] = 1.0
+        self._scaled = (stats - stats.mean(axis=0)) / spread
+        lengths = np.linalg.norm(stats, axis=1, keepdims=True)
+        lengths[lengths == 0] = 1.0
+        self._unit = stats / lengths
+
+    def _vectors(self, metric):
+        if metric not in self.METRICS:
+            raise ValueError("metric must be one of " + ", ".join(self.METRICS))
+        return self._scaled if metric == "euclidean" else self._unit
+
+    def _type_mask(self, type_name):
+        return (np.array(self.type_masks, dtype=np.int64) & type_bit(type_name)) != 0
+
+    @staticmethod
+    def _distances(vectors, queries, metric):
+        '''distance of every query row to every row of vectors, as a (len(queries), len(vectors)) matrix'''
+        if metric == "cosine":
+            return 1.0 - queries @ vectors.T
+        squared = (queries ** 2).sum(axis=1)[:, None] + (vectors ** 2).sum(axis=1)[None, :] - 2.0 * (queries @ vectors.T)
+        return np.sqrt(np.maximum(squared, 0.0))
+
+    @staticmethod
+    def _nearest(distances, k):
+        '''positions of the k smallest distances, closest first'''
+        k = min(k, int(np.isfinite(distances).sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=int)
+        closest = np.argpartition(distances, k - 1)[:k]
+        return closest[np.argsort(distances[closest], kind="stable")]
+
+    def neighbours(self, name, k=5, metric="euclidean", type_name=None):
+        '''The k Pokemon with stats most like name's
+
+        Parameters
+        ----------
+        name: string
+            The Pokemon to compare against, in any case
+        k: integer
+            How many Pokemon to return
+        metric: string
+            "euclidean" or "cosine"
+        type_name: string
+            Only return Pokemon of this type (e.g. "fire") when given
+
+        Returns
+        -------
+        list
+            (name, distance) tuples, closest first. The Pokemon itself is never included.
+        '''
+        with self._lock:
+            vectors = self._vectors(metric)
+            position = self._keys.get(normalize_name(name))
+            if position is None:
+                raise LookupError(name + " is not in the database")
+            distances = self._distances(vectors, vectors[position:position + 1], metric)[0]
+            distances[position] = np.inf
+            if type_name:
+                distances[~self._type_mask(type_name)] = np.inf
+            return [(self.names[i], float(distances[i])) for i in self._nearest(distances, k)]
+
+    def all_pairs(self, k=5, metric="euclidean", type_name=None, chunk_size=256):
+        '''The k nearest Pokemon of every Pokemon, worked out a block of rows at a time
+
+        Parameters
+        ----------
+        k: integer
+            How many neighbours per Pokemon
+        metric: string
+            "euclidean" or "cosine"
+        type_name: string
+            Only compare Pokemon of this type when given
+        chunk_size: integer
+            Rows per block, which bounds memory to chunk_size x number of Pokemon distances
+
+        Returns
+        -------
+        generator
+            yields (name, [(neighbour name, distance), ...]) in the order of names
+        '''
+        vectors = self._vectors(metric)
+        positions = np.arange(len(self.names))
+        if type_name:
+            positions = positions[self._type_mask(type_name)]
+        subset = vectors[positions]
+        for start in range(0, len(positions), chunk_size):
+            block = self._distances(subset, subset[start:start + chunk_size], metric)
+            for offset, distances in enumerate(block):
+                distances[start + offset] = np.inf
+                nearest = self._nearest(distances, k)
+                yield self.names[positions[start + offset]], [(self.names[positions[i]], float(distances[i])) for i in nearest]
+
+SIMILARITY_INDEX = None
+
+def get_similarity_index(conn=None):
+    '''The shared SimilarityIndex, refreshed against the database before it is returned'''
+    global SIMILARITY_INDEX
+    if SIMILARITY_INDEX is None:
+        SIMILARITY_INDEX = SimilarityIndex()
+    SIMILARITY_INDEX.refresh(conn)
+    return SIMILARITY_INDEX
+
+#########################################################
+######TYPE MATCHUPS AND TEAM COVERAGE####################
+#########################################################
+
+#attacking type -> (defending types it is super effective against, types that resist it, types immune to it)
+TYPE_CHART = {
+    "normal": ((), ("rock", "steel"), ("ghost",)),
+    "fire": (("grass", "ice", "bug", "steel"), ("fire", "water", "rock", "dragon"), ()),
+    "water": (("fire", "ground", "rock"), ("water", "grass", "dragon"), ()),
+    "electric": (("water", "flying"), ("electric", "grass", "dragon"), ("ground",)),
+    "grass": (("water", "ground", "rock"), ("fire", "grass", "poison", "flying", "bug", "dragon", "steel"), ()),
+    "ice": (("grass", "ground", "flying", "dragon"), ("fire", "water", "ice", "steel"), ()),
+    "fighting": (("normal", "ice", "rock", "dark", "steel"), ("poison", "flying", "psychic", "bug", "fairy"), ("ghost",)),
+    "poison": (("grass", "fairy"), ("poison", "ground", "rock", "ghost"), ("steel",)),
+    "ground": (("fire", "electric", "poison", "rock", "steel"), ("grass", "bug"), ("flying",)),
+    "flying": (("grass", "fighting", "bug"), ("electric", "rock", "steel"), ()),
+    "psychic": (("fighting", "poison"), ("psychic", "steel"), ("dark",)),
+    "bug": (("grass", "psychic", "dark"), ("fire", "fighting", "poison", "flying", "ghost", "steel", "fairy"), ()),
+    "rock": (("fire", "ice", "flying", "bug"), ("fighting", "ground", "steel"), ()),
+    "ghost": (("psychic", "ghost"), ("dark",), ("normal",)),
+    "dragon": (("dragon",), ("steel",), ("fairy",)),
+    "dark": (("psychic", "ghost"), ("fighting", "dark", "fairy"), ()),
+    "steel": (("ice", "rock", "fairy"), ("fire", "water", "electric", "steel"), ()),
+    "fairy": (("fighting", "dragon", "dark"), ("fire", "poison", "steel"), ()),
+}
+
+def make_type_effectiveness():
+    '''18x18 matrix of damage multipliers, rows are the attacking type and columns the defending type (TYPE_NAMES order)'''
+    effectiveness = np.ones((len(TYPE_NAMES), len(TYPE_NAMES)), dtype=np.float64)
+    for attacking, (strong, weak, immune) in TYPE_CHART.items():
+        row = TYPE_NAMES.index(attacking)
+        for multiplier, defending_types in ((2.0, strong), (0.5, weak), (0.0, immune)):
+            for defending in defending_types:
+                effectiveness[row, TYPE_NAMES.index(defending)] = multiplier
+    return effectiveness
+
+TYPE_EFFECTIVENESS = make_type_effectiveness()
+
+def masks_to_onehot(masks):
+    '''(len(masks), 18) matrix of 0/1 with a 1 for every type bit set in each mask'''
+    masks = np.asarray(masks, dtype=np.int64)
+    return ((masks[:, None] >> np.arange(len(TYPE_NAMES))) & 1).astype(np.float64)
+
+def defensive_multipliers(masks):
+    '''Damage multiplier every attacking type deals to each Pokemon
+
+    Parameters
+    ----------
+    masks: sequence of integers
+        type masks of the defending Pokemon
+
+    Returns
+    -------
+    numpy array
+        shape (len(masks), 18), column i is the multiplier of an attack of TYPE_NAMES[i]
+    '''
+    onehot = masks_to_onehot(masks)
+    #a dual type multiplies its two columns together, which is a sum of logarithms. Immunities are counted separately.
+    immune = TYPE_EFFECTIVENESS == 0
+    log_effectiveness = np.log2(np.where(immune, 1.0, TYPE_EFFECTIVENESS))
+    multipliers = np.exp2(onehot @ log_effectiveness.T)
+    multipliers[(onehot @ immune.T.astype(np.float64)) > 0] = 0.0
+    return multipliers
+
+
+class TypeMatchups:
+    '''Type matchups of every Pokemon in the database, worked out with matrix operations over TYPE_EFFECTIVENESS
+
+    The type masks of the whole dex and the multiplier every attacking type deals to each Pokemon are kept in
+    memory and re-read only when the data generation changes. Offense assumes each Pokemon attacks with moves
+    of its own types.
+
+    e.g. how well a team covers itself and the best sixth member:
+        matchups = get_type_matchups()
+        matchups.team_report(["charizard", "blastoise", "pikachu", "gengar", "snorlax"])
+        matchups.score_candidates(["charizard", "blastoise", "pikachu", "gengar", "snorlax"], k=5)
+
+    Instance Attributes
+    --------------
+    names: list
+    Pokemon names, one per row
+
+    masks: numpy array
+    type mask of each row
+
+    defense: numpy array
+    defensive_multipliers(masks), shape (number of Pokemon, 18)
+    '''
+
+    def __init__(self):
+        self.names = []
+        self.masks = np.zeros(0, dtype=np.int64)
+        self.defense = np.zeros((0, len(TYPE_NAMES)), dtype=np.float64)
+        self._keys = {}
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def refresh(self, conn=None):
+        '''Re-read the type masks if a loader wrote to the database since the last refresh
+
+        Parameters
+        ----------
+        conn: sqlite3.Connection
+            Connection to PokemonData. A new connection is opened (and closed) when None.
+
+        Returns
+        -------
+        bool
+            whether anything was re-read
+        '''
+        own_connection = conn is None
+        if own_connection:
+            conn = open_database()
+        try:
+            with self._lock:
+                generation = data_generation(conn)
+                if generation == self._generation:
+                    return False
+                rows = conn.execute("SELECT Pokemon.name, Pokemon.type_mask FROM Pokemon INNER JOIN Pokemon_Extra ON Pokemon.name=Pokemon_Extra.name ORDER BY Pokemon_Extra.dex_number").fetchall()
+                self.names = [row[0] for row in rows]
+                self.masks = np.array([row[1] for row in rows], dtype=np.int64)
+                self.defense = defensive_multipliers(self.masks)
+                self._keys = dict((normalize_name(name), position) for (position, name) in enumerate(self.names))
+                self._generation = generation
+                return True
+        finally:
+            if own_connection:
+                conn.close()
+
+    def positions(self, names):
+        '''Rows of the named Pokemon. Raises LookupError for a name that isn't in the database.'''
+        positions = []
+        for name in names:
+            position = self._keys.get(normalize_name(name))
+            if position is None:
+                raise LookupError(name + " is not in the database")
+            positions.append(position)
+        return np.array(positions, dtype=np.int64)
+
+    def offense(self, masks):
+        '''Best multiplier each attacker gets against every Pokemon in the dex, using moves of its own types
+
+        Parameters
+        ----------
+        masks: sequence of integers
+            type masks of the attackers
+
+        Returns
+        -------
+        numpy array
+            shape (len(masks), number of Pokemon)
+        '''
+        masks = np.asarray(masks, dtype=np.int64)
+        #there are far fewer type combinations than Pokemon, so each distinct mask is worked out once
+        unique_masks, inverse = np.unique(masks, return_inverse=True)
+        best = np.zeros((len(unique_masks), len(self.names)), dtype=np.float64)
+        for row, onehot in enumerate(masks_to_onehot(unique_masks)):
+            attacking = np.flatnonzero(onehot)
+            if len(attacking):
+                best[row] = self.defense[:, attacking].max(axis=1)
+        return best[inverse.ravel()]
+
+    def team_report(self, team):
+        '''Defensive and offensive coverage of a team
+
+        Parameters
+        ----------
+        team: list
+            Pokemon names, in any case
+
+        Returns
+        -------
+        dict
+            "types": per attacking type, how many members are "weak", "resist" or are "immune" to it and the
+            team "multipliers" (one per member), "weaknesses": attacking types more members are weak to than resist,
+            "super_effective": share of the dex at least one member hits super effectively,
+            "uncovered": names of Pokemon no member hits super effectively
+        '''
+        with self._lock:
+            positions = self.positions(team)
+            defense = self.defense[positions]
+            covered = (self.offense(self.masks[positions]) >= 2).any(axis=0)
+            weak = (defense > 1).sum(axis=0)
+            resist = ((defense < 1) & (defense > 0)).sum(axis=0)
+            immune = (defense == 0).sum(axis=0)
+            report = {"team": [self.names[position] for position in positions], "types": {}, "weaknesses": []}
+            for i, type_name in enumerate(TYPE_NAMES):
+                report["types"][type_name] = {"weak": int(weak[i]), "resist": int(resist[i]), "immune": int(immune[i]), "multipliers": [float(value) for value in defense[:, i]]}
+                if weak[i] > resist[i] + immune[i]:
+                    report["weaknesses"].append(type_name)
+            report["super_effective"] = float(covered.mean()) if len(covered) else 0.0
+            report["uncovered"] = [self.names[i] for i in np.flatnonzero(~covered)]
+            return report
+
+    def score_candidates(self, team, k=10):
+        '''Score every Pokemon in the dex as the next team member, all at once
+
+        A candidate earns a point for every team weakness it resists (two if it is immune), loses one for every
+        team weakness it shares, and earns the share of the dex it would newly hit super effectively.
+
+        Parameters
+        ----------
+        team: list
+            Pokemon names already on the team, in any case
+        k: integer
+            How many candidates to return
+
+        Returns
+        -------
+        list
+            dicts with "name", "score", "defense" and "offense" (the two parts of the score), best first
+        '''
+        with self._lock:
+            positions = self.positions(team)
+            team_defense = self.defense[positions]
+            weaknesses = (team_defense > 1).sum(axis=0) > ((team_defense < 1).sum(axis=0))
+            covered = (self.offense(self.masks[positions]) >= 2).any(axis=0)
+            candidate_defense = self.defense[:, weaknesses]
+            defense_score = ((candidate_defense < 1).sum(axis=1) + (candidate_defense == 0).sum(axis=1) - (candidate_defense > 1).sum(axis=1)).astype(np.float64)
+            offense_score = ((self.offense(self.masks) >= 2) & ~covered).sum(axis=1) / max(len(self.names), 1)
+            scores = defense_score + offense_score
+            scores[positions] = -np.inf
+            k = min(k, len(self.names) - len(set(positions.tolist())))
+            if k <= 0:
+                return []
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            return [{"name": self.names[i], "score": float(scores[i]), "defense": float(defense_score[i]), "offense": float(offense_score[i])} for i in best]
+
+TYPE_MATCHUPS = None
+
+def get_type_matchups(conn=None):
+    '''The shared TypeMatchups, refreshed against the database before it is returned'''
+    global TYPE_MATCHUPS
+    if TYPE_MATCHUPS is None:
+        TYPE_MATCHUPS = TypeMatchups()
+    TYPE_MATCHUPS.refresh(conn)
+    return TYPE_MATCHUPS
+
+#########################################################
+######LEADERBOARDS AND STAT DISTRIBUTIONS################
+#########################################################
+
+class Leaderboards:
+    '''In-memory sorted index of every stat in LEADERBOARD_STATS, for top lists, ranks and percentiles
+
+    Each stat keeps its values sorted in ascending order with the matching names alongside, so the rank or
+    percentile of a value is a binary search. refresh() does nothing while the data generation stays the
+    same and otherwise moves only the Pokemon whose rows changed (see read_changed_pokemon()).
+
+    e.g. the ten fastest Pokemon and where Pikachu ranks in special attack:
+        leaderboards = get_leaderboards()
+        leaderboards.top("speed", 10)
+        leaderboards.rank("pikachu", "special_attack")
+
+    Instance Attributes
+    --------------
+    values: dict
+    stat -> sorted list of values
+
+    names: dict
+    stat -> list of names in the same order as values[stat]
+    '''
+
+    def __init__(self):
+        self.values = dict((stat, []) for stat in LEADERBOARD_STATS)
+        self.names = dict((stat, []) for stat in LEADERBOARD_STATS)
+        self._stats = {}
+        self._keys = {}
+        self._hashes = {}
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def refresh(self, conn=None):
+        '''Bring the sorted lists up to date with the Pokemon table
+
+        Parameters
+        ----------
+        conn: sqlite3.Connection
+            Connection to PokemonData. A new connection is opened (and closed) when None.
+
+        Returns
+        -------
+        integer
+            number of Pokemon added, changed or removed
+        '''
+        own_connection = conn is None
+        if own_connection:
+            conn = open_database()
+        try:
+            with self._lock:
+                generation = data_generation(conn)
+                if generation == self._generation:
+                    return 0
+                self._hashes, changed, removed = read_changed_pokemon(conn, self._hashes, LEADERBOARD_STATS)
+                for name in removed:
+                    self._take_out(name)
+                for row in changed:
+                    self._take_out(row[0])
+                    self._put_in(row[0], row[1:])
+                self._generation = generation
+                return len(changed) + len(removed)
+        finally:
+            if own_connection:
+                conn.close()
+
+    def _take_out(self, name):
+        stats = self._stats.pop(name, None)
+        if stats is None:
+            return
+        del self._keys[normalize_name(name)]
+        for stat, value in zip(LEADERBOARD_STATS, stats):
+            if value is None:
+                continue
+            values, names = self.values[stat], self.names[stat]
+            position = bisect.bisect_left(values, value)
+            #equal values sit next to each other, so the name is a short walk away
+            while names[position] != name:
+                position += 1
+            del values[position]
+            del names[position]
+
+    def _put_in(self, name, stats):
+        self._stats[name] = stats
+        self._keys[normalize_name(name)] = name
+        for stat, value in zip(LEADERBOARD_STATS, stats):
+            if value is None:
+                continue
+            position = bisect.bisect_right(self.values[stat], value)
+            self.values[stat].insert(position, value)
+            self.names[stat].insert(position, name)
+
+    def _check_stat(self, stat):
+        if stat not in LEADERBOARD_STATS:
+            raise ValueError("stat must be one of " + ", ".join(LEADERBOARD_STATS))
+
+    def top(self, stat, k=10, lowest=False):
+        '''The k Pokemon with the highest (or lowest) value of a stat
+
+        Returns
+        -------
+        list
+            (name, value) tuples, best first
+        '''
+        self._check_stat(stat)
+        k = max(k, 0)
+        #only the k ends of the sorted lists are copied, never the whole leaderboard
+        with self._lock:
+            names, values = self.names[stat], self.values[stat]
+            if lowest:
+                return list(zip(names[:k], values[:k]))
+            start = max(len(names) - k, 0)
+            return list(zip(reversed(names[start:]), reversed(values[start:])))
+
+    def rank(self, name, stat):
+        '''Where a Pokemon stands in one stat
+
+        Parameters
+        ----------
+        name: string
+            The Pokemon name, in any case
+        stat: string
+            One of LEADERBOARD_STATS
+
+        Returns
+        -------
+        dict
+            "value", "rank" (1 is the highest, ties share a rank), "out_of", and "percentile"
+            (percent of Pokemon with a lower value). None if the Pokemon has no value for the stat.
+        '''
+        self._check_stat(stat)
+        with self._lock:
+            full_name = self._keys.get(normalize_name(name))
+            if full_name is None:
+                raise LookupError(name + " is not in the database")
+            value = self._stats[full_name][LEADERBOARD_STATS.index(stat)]
+            if value is None:
+                return None
+            values = self.values[stat]
+            higher = len(values) - bisect.bisect_right(values, value)
+            lower = bisect.bisect_left(values, value)
+            return {"name": full_name, "value": value, "rank": higher + 1, "out_of": len(values), "percentile": 100.0 * lower / len(values)}
+
+    def ranks(self, name):
+        '''rank() of a Pokemon in every stat of LEADERBOARD_STATS'''
+        return dict((stat, self.rank(name, stat)) for stat in LEADERBOARD_STATS)
+
+LEADERBOARDS = None
+
+def get_leaderboards(conn=None):
+    '''The shared Leaderboards, refreshed against the database before they are returned'''
+    global LEADERBOARDS
+    if LEADERBOARDS is None:
+        LEADERBOARDS = Leaderboards()
+    LEADERBOARDS.refresh(conn)
+    return LEADERBOARDS
+
+def type_stat_averages(conn, stat):
+    '''Mean and standard deviation of one stat for every type (and "all"), read from the Type_Stats aggregates
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        Connection to PokemonData
+    stat: string
+        One of LEADERBOARD_STATS
+
+    Returns
+    -------
+    list
+        dicts with "type", "count", "mean" and "std", highest mean first
     '''
-    #execute the drop + creation of Pokemon
-    cur.execute(drop_pokemon)
-    cur.execute(create_pokemon)
+    if stat not in LEADERBOARD_STATS:
+        raise ValueError("stat must be one of " + ", ".join(LEADERBOARD_STATS))
+    averages = []
+    for type_name, count, total, total_squares in conn.execute("SELECT type, count, total, total_squares FROM Type_Stats WHERE stat = ?", (stat,)):
+        mean = total / count
+        averages.append({"type": type_name, "count": count, "mean": mean, "std": max(total_squares / count - mean * mean, 0.0) ** 0.5})
+    averages.sort(key=lambda average: average["mean"], reverse=True)
+    return averages
 
-    #make sure Pokemon_Extra doesn't exist
-    drop_extra_data = '''
-        DROP TABLE IF EXISTS Pokemon_Extra;
+def make_distribution_figure(name, leaderboards=None):
+    '''Box plots of every stat over the whole database, with one Pokemon marked on each and labelled with its rank
+
+    Parameters
+    ----------
+    name: string
+        The Pokemon to mark, in any case
+    leaderboards: Leaderboards
+        Defaults to get_leaderboards()
+
+    Returns
+    -------
+    plotly Figure
     '''
-    #create Pokemon_Extra with dex number, height, weight, gender_ratio. Also add name as foreign key
-    create_extra_data = '''
-        CREATE TABLE IF NOT EXISTS Pokemon_Extra(
-            dex TEXT PRIMARY KEY,
-            height TEXT NOT NULL,
-            weight TEXT NOT NULL,
-            gender_ratio TEXT NOT NULL,
-            name TEXT NOT NULL,
-            FOREIGN KEY (name) REFERENCES Pokemon(name)
-        );
+    if leaderboards is None:
+        leaderboards = get_leaderboards()
+    ranks = leaderboards.ranks(name)
+    full_name = next(rank["name"] for rank in ranks.values() if rank is not None)
+    with PROFILER.stage("plot build"):
+        fig = go.Figure()
+        #base stat total is on a different scale, so it gets its own axis on the right
+        for stat in LEADERBOARD_STATS:
+            label = stat.replace("_", " ").title()
+            fig.add_trace(go.Box(y=leaderboards.values[stat], name=label, boxpoints=False, showlegend=False, yaxis="y2" if stat == "base_stat_total" else "y"))
+        marked = [(stat, rank) for (stat, rank) in ranks.items() if rank is not None]
+        for stat, rank in marked:
+            fig.add_trace(go.Scatter(x=[stat.replace("_", " ").title()], y=[rank["value"]], mode="markers+text", marker={"size": 12, "color": "crimson"},
+                text=["#" + str(rank["rank"]) + " of " + str(rank["out_of"]) + " (" + format(rank["percentile"], ".0f") + "%)"], textposition="middle right",
+                name=full_name, showlegend=stat == marked[0][0], yaxis="y2" if stat == "base_stat_total" else "y"))
+        fig.update_layout(title_text=full_name + " against every Pokemon in the database", yaxis2={"overlaying": "y", "side": "right", "title": "Base Stat Total"})
+    return fig
+
+#########################################################
+######STAT VIEWS AND BATCH REPORTS#######################
+#########################################################
+
+#each stat view: the word used in its title, how it is announced, and the (label, field) of every bar
+STAT_VIEWS = {
+    'physical': ("Physical", "physical attributes", [('attack', 'attack'), ('defense', 'defense')]),
+    'special': ("Special", "special attributes", [('special attack', 'special_attack'), ('special defense', 'special_defense')]),
+    'offense': ("Offensive", "offensive attributes", [('attack', 'attack'), ('special_attack', 'special_attack'), ('speed', 'speed')]),
+    'defense': ("Defensive", "defensive attributes", [('hp', 'hp'), ('defense', 'defense'), ('special_defense', 'special_defense')]),
+    'extra': ("Extra", "extra properties", [('height (m)', 'height_m'), ('weight (kg)', 'weight_kg')]),
+}
+#directory batch reports are written to
+REPORT_DIR = "pokedex_report"
+
+def database_row_to_dict(row):
+    '''Turn a row returned by PokedexQuery.lookup() into a dict keyed like the attributes of a Pokemon instance,
+    plus the numeric height_m and weight_kg'''
+    return {"name": row[0], "classification": row[1], "types": row[2], "hp": row[3], "attack": row[4], "defense": row[5],
+            "special_attack": row[6], "special_defense": row[7], "speed": row[8], "dex": row[9], "height": row[10],
+            "weight": row[11], "genderRatio": row[12], "height_m": row[14], "weight_kg": row[15]}
+
+def stat_view_data(pokemon, view):
+    '''The bars of one stat view
+
+    Parameters
+    ----------
+    pokemon: dict
+        keyed like the attributes of a Pokemon instance. height_m and weight_kg are parsed from the text
+        height and weight when missing.
+    view: string
+        A key of STAT_VIEWS
+
+    Returns
+    -------
+    tuple
+        (bar labels, bar values)
     '''
+    title_word, description, bars = STAT_VIEWS[view]
+    values = dict(pokemon)
+    if values.get("height_m") is None and "height" in values:
+        values["height_m"] = parse_height(values["height"])
+    if values.get("weight_kg") is None and "weight" in values:
+        values["weight_kg"] = parse_weight(values["weight"])
+    #the leading blank bar keeps the look of the original charts
+    xvals = ['stat'] + [label for (label, field) in bars]
+    yvals = [' '] + [values[field] for (label, field) in bars]
+    return xvals, yvals
 
-    #execute drop + creation of Pokemon_Extra
-    cur.execute(drop_extra_data)
-    cur.execute(create_extra_data)
+def make_stat_figure(pokemon, view, title_noun="Properties"):
+    '''Bar graph of one stat view for one Pokemon
 
-    #commit changes and close the database
-    conn.commit()
-    conn.close()
-    return
+    Parameters
+    ----------
+    pokemon: dict
+        keyed like the attributes of a Pokemon instance
+    view: string
+        A key of STAT_VIEWS
+    title_noun: string
+        Last word of the title before "of", e.g. "Physical Properties of Pikachu"
 
-def store_pokemon_in_database1():
-    '''Store static pokemon data into the first establised SQLite Table'''
+    Returns
+    -------
+    plotly Figure
+    '''
+    xvals, yvals = stat_view_data(pokemon, view)
+    with PROFILER.stage("plot build"):
+        bar_data = go.Bar(x=xvals, y=yvals)
+        title = STAT_VIEWS[view][0] + " " + title_noun + " of " + pokemon["name"]
+        return go.Figure(data=bar_data, layout_title_text=title)
 
-    #Connect to PokemonData then insert rows and columns into Pokemon table
-    conn = sqlite3.connect("PokemonData.sqlite")
-    cur = conn.cursor()
-    insert_pokemon = '''
-    INSERT OR REPLACE INTO Pokemon (name, classification, types, hp, attack, defense, special_attack, special_defense, speed)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+def report_filename(name, taken=()):
+    '''File name of a Pokemon's report page, e.g. "mr-mime.html". Nidoran♀ and Nidoran♂ become "nidoran-f.html" and
+    "nidoran-m.html", and a name whose slug is already in taken gets a counter, e.g. "mr-mime-2.html".'''
+    slug = re.sub(r'[^a-z0-9]+', '-', normalize_name(name).replace("♀", "-f").replace("♂", "-m")).strip('-') or "pokemon"
+    filename = slug + ".html"
+    count = 1
+    while filename in taken:
+        count += 1
+        filename = slug + "-" + str(count) + ".html"
+    return filename
+
+REPORT_PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title>
+<script src="plotly.min.js"></script>
+<script src="plotly_template.js"></script></head>
+<body>
+<p><a href="index.html">All Pokemon</a></p>
+<h1>{title}</h1>
+<p>{summary}</p>
+{charts}
+</body>
+</html>
 '''
 
-    #Check the Cache Dictionary to see if Pokemon is in there. If not, proceed to add with the appropriate values.
-    CACHE_DICT = open_cache()
-    for pokemon in CACHE_DICT:
-        current_pokemon_instance = CACHE_DICT[pokemon]
-        current_pokemon_dict = json.loads(current_pokemon_instance)
-        pokemon_to_add = [current_pokemon_dict["name"], current_pokemon_dict["classification"], current_pokemon_dict["types"], current_pokemon_dict["hp"], current_pokemon_dict["attack"], current_pokemon_dict["defense"], current_pokemon_dict["special_attack"], current_pokemon_dict["special_defense"], current_pokemon_dict["speed"]]
-        cur.execute(insert_pokemon, pokemon_to_add)
-        conn.commit()
+def report_chart(figure, chart_id):
+    '''The html of one chart on a report page, without the plotly.js library or the Plotly theme
 
-    return
+    Parameters
+    ----------
+    figure: plotly Figure
+        The chart to draw
+    chart_id: string
+        id of the div the chart is drawn into
 
-def store_pokemon_in_database2():
-    '''Store static extra pokemon data into the second establised SQLite Table'''
+    Returns
+    -------
+    tuple
+        (html, the figure's theme as a dict)
+    '''
+    figure_json = figure.to_plotly_json()
+    layout = figure_json["layout"]
+    #the theme is identical for every chart, so it is shipped once in plotly_template.js instead
+    theme = layout.pop("template", None)
+    chart = '<div id="' + chart_id + '"></div>\n<script>Plotly.newPlot("' + chart_id + '", ' + plotly.io.json.to_json_plotly(figure_json["data"]) + ', Object.assign({template: POKEDEX_TEMPLATE}, ' + plotly.io.json.to_json_plotly(layout) + '));</script>'
+    return chart, theme
 
-    #Connect to PokemonData then insert rows and columns into Pokemon_Extra table
-    conn = sqlite3.connect("PokemonData.sqlite")
-    cur = conn.cursor()
-    insert_pokemon_extra = '''
-    INSERT OR REPLACE INTO Pokemon_Extra (dex, height, weight, gender_ratio, name)
-    VALUES (?, ?, ?, ?, ?)
-'''
-    #Check the Cache Dictionary to see if Pokemon is in there. If not, proceed to add with the appropriate values.
-    CACHE_DICT = open_cache()
-    for pokemon in CACHE_DICT:
-        current_pokemon_instance = CACHE_DICT[pokemon]
-        current_pokemon_dict = json.loads(current_pokemon_instance)
-        pokemon_to_add = [current_pokemon_dict["dex"], current_pokemon_dict["height"], current_pokemon_dict["weight"], current_pokemon_dict["genderRatio"], current_pokemon_dict['name']]
-        #print(pokemon_to_add)
-        cur.execute(insert_pokemon_extra, pokemon_to_add)
-        conn.commit()
+def generate_report(names=None, out_dir=REPORT_DIR):
+    '''Render every stat view for a list of Pokemon (or the whole database) into one static site that works offline.
+    plotly.js and the Plotly theme are written once (plotly.min.js and plotly_template.js) and every page links to them,
+    so each page only carries its own data.
 
-    return
+    Parameters
+    ----------
+    names: list
+        Pokemon names to include. Every Pokemon in the database when None.
+    out_dir: string
+        Directory the site is written to
 
+    Returns
+    -------
+    list
+        names of the Pokemon that made it into the report
+    '''
+    frame = PokedexFrame.load()
+    if names is not None:
+        wanted = set(normalize_name(name) for name in names)
+        frame = frame.where(np.array([normalize_name(name) in wanted for name in frame["name"]], dtype=bool))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "plotly.min.js"), "w", encoding="utf-8") as plotly_file:
+        plotly_file.write(plotly.offline.get_plotlyjs())
+    links = []
+    filenames = set()
+    theme = None
+    for pokemon in frame.to_dicts():
+        charts = []
+        for view in STAT_VIEWS:
+            with PROFILER.stage("plot render"):
+                chart, theme = report_chart(make_stat_figure(pokemon, view), "chart-" + view)
+            charts.append(chart)
+        summary = html.escape(pokemon["classification"] + ", " + pokemon["types"])
+        page = REPORT_PAGE_TEMPLATE.format(title=html.escape(pokemon["name"]), summary=summary, charts="\n".join(charts))
+        filename = report_filename(pokemon["name"], filenames)
+        filenames.add(filename)
+        with open(os.path.join(out_dir, filename), "w", encoding="utf-8") as page_file:
+            page_file.write(page)
+        links.append('<li><a href="' + filename + '">' + html.escape(pokemon["name"]) + '</a></li>')
+    with open(os.path.join(out_dir, "plotly_template.js"), "w", encoding="utf-8") as theme_file:
+        theme_file.write("var POKEDEX_TEMPLATE = " + plotly.io.json.to_json_plotly(theme or {}) + ";\n")
+    index_page = '<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>Pokedex Report</title></head>\n<body>\n<h1>Pokedex Report</h1>\n<ul>\n' + "\n".join(links) + '\n</ul>\n</body>\n</html>\n'
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as index_file:
+        index_file.write(index_page)
+    print("Wrote a report of " + str(len(links)) + " Pokemon to " + os.path.join(out_dir, "index.html"))
+    return [pokemon_name for pokemon_name in frame["name"]]
 
 #########################################################
-######ADDING ITEMS TO THE DATABASE IN SQL################
+######NON-INTERACTIVE BATCH QUERIES######################
 #########################################################
-def adding_first_151_to_database():
-    'Adds the first 151 Pokemon to the SQL Database PokemonData. Will skip over Pokemon in the first 151 that are not currently added to Sword and Shield'
-    #creating dictionaries to loop over and check
-    serebii_poke_dict = build_pokemon_dict()
-    CACHE_DICT = open_cache()
-    ct = 0
-    for url in serebii_poke_dict.values():
-        #break out of the loop if the dictionary is already established
-        if len(CACHE_DICT) >= 110:
-            break
+
+#columns written for every resolved Pokemon, in order
+BATCH_FIELDS = ["query", "source", "name", "dex", "types", "classification", "hp", "attack", "defense", "special_attack", "special_defense", "speed", "height", "weight", "genderRatio", "height_m", "weight_kg"]
+
+def resolve_pokemon(name, pokedex_query):
+    '''Find a Pokemon by name in the database, then the cache, then by scraping Serebii
+
+    Parameters
+    ----------
+    name: string
+        The Pokemon name, in any case
+    pokedex_query: PokedexQuery
+        Open query layer over PokemonData
+
+    Returns
+    -------
+    tuple
+        (dict keyed like BATCH_FIELDS without query, where it was found: "database", "cache" or "scraper")
+    '''
+    row = pokedex_query.lookup(name)
+    if row is not None:
+        pokemon = database_row_to_dict(row)
+        source = "database"
+    else:
+        pokemon_url = get_pokemon_dictionary().get(normalize_name(name))
+        if pokemon_url is None:
+            raise LookupError("not a Pokemon name")
+        source = "cache" if pokemon_url in open_cache() else "scraper"
+        try:
+            pokemon = json.loads(get_pokemon_instance(pokemon_url))
+        except PokemonNotInGame:
+            raise LookupError("not in Sword and Shield")
+        except requests.RequestException as error:
+            raise LookupError("could not fetch " + pokemon_url + ": " + str(error))
+        pokemon["height_m"] = parse_height(pokemon["height"])
+        pokemon["weight_kg"] = parse_weight(pokemon["weight"])
+        for stat in ("hp", "attack", "defense", "special_attack", "special_defense", "speed"):
+            pokemon[stat] = parse_stat(pokemon[stat])
+    pokemon["source"] = source
+    return pokemon
+
+def run_batch(names, output_stream, error_stream, output_format="jsonl"):
+    '''Resolve many Pokemon names without a prompt, writing each result as soon as it is found.
+    Repeated names are only resolved and written once. Everything the lookups print goes to stderr,
+    so output_stream only ever holds results and error_stream only unresolved names.
+
+    Parameters
+    ----------
+    names: iterable of strings
+        One Pokemon name per item, e.g. the lines of a file. Blank lines are skipped.
+    output_stream: file
+        Where resolved Pokemon are written
+    error_stream: file
+        Where names that could not be resolved are written, along with the reason
+    output_format: string
+        "jsonl" for one JSON object per line, or "csv"
+
+    Returns
+    -------
+    dict
+        number of names "resolved", "failed" and "duplicates" skipped
+    '''
+    counts = {"resolved": 0, "failed": 0, "duplicates": 0}
+    seen = set()
+    if output_format == "csv":
+        writer = csv.DictWriter(output_stream, fieldnames=BATCH_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        error_writer = csv.writer(error_stream)
+        error_writer.writerow(["query", "error"])
+    pokedex_query = PokedexQuery()
+    new_entries = False
+    for line in names:
+        name = line.strip()
+        if not name:
+            continue
+        key = normalize_name(name)
+        if key in seen:
+            counts["duplicates"] += 1
+            continue
+        seen.add(key)
+        try:
+            with contextlib.redirect_stdout(sys.stderr):
+                pokemon = resolve_pokemon(name, pokedex_query)
+        except LookupError as error:
+            counts["failed"] += 1
+            if output_format == "csv":
+                error_writer.writerow([name, str(error)])
+            else:
+                error_stream.write(json.dumps({"query": name, "error": str(error)}) + "\n")
+            error_stream.flush()
+            continue
+        counts["resolved"] += 1
+        new_entries = new_entries or pokemon["source"] != "database"
+        pokemon["query"] = name
+        if output_format == "csv":
+            writer.writerow(pokemon)
         else:
+            output_stream.write(json.dumps(dict((field, pokemon.get(field)) for field in BATCH_FIELDS), ensure_ascii=False) + "\n")
+        output_stream.flush()
+    pokedex_query.close()
+    #anything found outside the database is loaded into it, so the next batch finds it there
+    if new_entries:
+        with contextlib.redirect_stdout(sys.stderr):
+            load_cache_into_database()
+    return counts
+
+#########################################################
+######LOCAL HTTP QUERY SERVICE###########################
+#########################################################
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8151
+#read-only connections shared by the service's worker threads
+SERVICE_POOL_SIZE = 4
+#most responses kept in the service's in-memory response cache
+SERVICE_CACHE_SIZE = 1024
+#columns the /filter endpoint may filter and sort on
+FILTER_COLUMNS = ("hp", "attack", "defense", "special_attack", "special_defense", "speed", "height_m", "weight_kg", "dex_number")
+HTTP_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+class ReadPool:
+    '''Fixed pool of read-only SQLite connections to PokemonData that can be shared between threads
+
+    Instance Attributes
+    --------------
+    size: integer
+    Number of connections in the pool
+    '''
+
+    def __init__(self, filename=DATABASE_FILENAME, size=SERVICE_POOL_SIZE):
+        #make sure the schema is current before opening read-only connections that can't migrate it
+        open_database(filename).close()
+        self.size = size
+        self._connections = queue.Queue()
+        uri = "file:" + urllib.parse.quote(os.path.abspath(filename)) + "?mode=ro"
+        for i in range(size):
+            self._connections.put(sqlite3.connect(uri, uri=True, check_same_thread=False))
+
+    @contextlib.contextmanager
+    def connection(self):
+        '''Borrow a connection for the duration of a with block, waiting if they are all in use'''
+        conn = self._connections.get()
+        try:
+            yield conn
+        finally:
+            self._connections.put(conn)
+
+    def close(self):
+        for i in range(self.size):
+            self._connections.get().close()
+
+
+class PokedexService:
+    '''Small asyncio HTTP service answering Pokedex queries with JSON
+
+    Endpoints (all GET):
+        /pokemon/<name>                 one Pokemon
+        /pokemon?names=<a>,<b>,...      many Pokemon
+        /filter?stat=speed&min=100&max=150&type=fire&sort=attack&limit=20
+        /chart/<name>/<view>            bar data of a stat view (physical, special, offense, defense, extra)
+        /similar/<name>?k=5&metric=cosine&type=fire
+                                        Pokemon with the closest base stats
+        /team?names=<a>,<b>,...&k=5     type coverage of a team and the best candidates to add
+        /top/<stat>?k=10&lowest=1       leaderboard of one stat
+        /rank/<name>                    rank and percentile of a Pokemon in every stat
+        /types/<stat>                   mean and spread of one stat per type
+        /diff/<name>?from=<game>&to=<game>
+                                        what changed for a Pokemon between two crawled games
+
+    Database reads run on worker threads through a ReadPool so the event loop never blocks.
+    Answers are kept in an in-memory cache until the loaders write new rows. A Pokemon that isn't
+    in the database yet is scraped in the background and the request gets a 202 to retry later.
+    The list of Pokemon names is loaded once, off the event loop, when the service starts; if it
+    can't be loaded every unknown name gets a 404 until the service is restarted.
+
+    Instance Attributes
+    --------------
+    pool: ReadPool
+    Read-only connections to PokemonData
+
+    cache_size: integer
+    Most responses kept in memory
+    '''
+
+    def __init__(self, filename=DATABASE_FILENAME, pool_size=SERVICE_POOL_SIZE, cache_size=SERVICE_CACHE_SIZE):
+        self.pool = ReadPool(filename, pool_size)
+        self.cache_size = cache_size
+        self._responses = OrderedDict()
+        self._generation = None
+        self._pending_scrapes = set()
+        #scrapes get their own thread so they never hold up database reads
+        self._scraper = ThreadPoolExecutor(max_workers=1)
+        self._name_load = None
+
+    def _read(self, function, *args):
+        with self.pool.connection() as conn:
+            return function(conn, *args)
+
+    def _lookup(self, conn, name):
+        row = conn.execute(PokedexQuery.LOOKUP_QUERY, (normalize_name(name),)).fetchone()
+        if row is None:
+            return None
+        return database_row_to_dict(row)
+
+    def _lookup_many(self, conn, names):
+        return dict((name, self._lookup(conn, name)) for name in names)
+
+    def _filter(self, conn, stat, minimum, maximum, type_name, sort, limit):
+        query = '''
+            SELECT Pokemon.name, Pokemon.types, Pokemon.hp, Pokemon.attack, Pokemon.defense, Pokemon.special_attack,
+                Pokemon.special_defense, Pokemon.speed, Pokemon_Extra.height_m, Pokemon_Extra.weight_kg, Pokemon_Extra.dex_number
+            FROM Pokemon INNER JOIN Pokemon_Extra ON Pokemon.name=Pokemon_Extra.name
+            WHERE 1
+        '''
+        params = []
+        #column names can't be parameters, so they are checked against FILTER_COLUMNS instead
+        if minimum is not None:
+            query += " AND " + stat + " >= ?"
+            params.append(minimum)
+        if maximum is not None:
+            query += " AND " + stat + " <= ?"
+            params.append(maximum)
+        if type_name:
+            type_bit(type_name)
+            query += " AND Pokemon.name IN (SELECT name FROM Pokemon_Type WHERE type = ?)"
+            params.append(parse_types(type_name)[0])
+        query += " ORDER BY " + sort + " DESC LIMIT ?"
+        params.append(limit)
+        columns = ["name", "types", "hp", "attack", "defense", "special_attack", "special_defense", "speed", "height_m", "weight_kg", "dex_number"]
+        return [dict(zip(columns, row)) for row in conn.execute(query, params)]
+
+    def _team(self, conn, team, k):
+        type_matchups = get_type_matchups(conn)
+        return type_matchups.team_report(team), type_matchups.score_candidates(team, k)
+
+    def _top(self, conn, stat, k, lowest):
+        return get_leaderboards(conn).top(stat, k, lowest)
+
+    def _ranks(self, conn, name):
+        return get_leaderboards(conn).ranks(name)
+
+    def _diff(self, conn, name, first_game, second_game):
+        return dict((field, {"from": old_value, "to": new_value}) for (field, (old_value, new_value)) in game_diff(conn, name, first_game, second_game).items())
+
+    def _similar(self, conn, name, k, metric, type_name):
+        return get_similarity_index(conn).neighbours(name, k, metric, type_name)
+
+    def _scrape(self, url):
+        try:
+            get_pokemon_instance(url)
+            load_cache_into_database()
+        except PokemonNotInGame:
+            #recorded in the negative cache, so the next request answers 404 straight away
+            pass
+        except Exception as error:
+            print("[Error] Background scrape of " + url + " failed: " + str(error))
+        finally:
+            self._pending_scrapes.discard(url)
+
+    def _load_names(self):
+        return get_pokemon_dictionary(), get_name_index()
+
+    async def _names(self):
+        '''The name to url dictionary and NameIndex, loaded once on the scraper thread.
+        Loading may download the names with retries, so it must never run on the event loop.'''
+        if self._name_load is None:
+            #a scrape only starts once a name is found, so the load is always first on the scraper thread
+            self._name_load = self._scraper.submit(self._load_names)
+        return await asyncio.wrap_future(self._name_load)
+
+    async def _missing(self, loop, name):
+        '''Response for a Pokemon that isn't in the database: start a background scrape if the name is known'''
+        pokemon_dictionary, name_index = await self._names()
+        pokemon_url = pokemon_dictionary.get(normalize_name(name))
+        if pokemon_url is None:
+            return 404, {"error": "not a Pokemon name", "name": name, "suggestions": name_index.suggest(name)}
+        known_absent = await loop.run_in_executor(None, open_cache().absent, pokemon_url)
+        if known_absent is not None:
+            return 404, {"error": "not in Sword and Shield", "name": name, "reason": known_absent.reason, "checked_at": known_absent.checked_at}
+        if pokemon_url not in self._pending_scrapes:
+            self._pending_scrapes.add(pokemon_url)
+            loop.run_in_executor(self._scraper, self._scrape, pokemon_url)
+        return 202, {"status": "pending", "name": name, "detail": "not in the database yet, being scraped. Try again shortly."}
+
+    async def respond(self, path):
+        '''Answer one GET request
+
+        Parameters
+        ----------
+        path: string
+            The request target, including any query string
+
+        Returns
+        -------
+        tuple
+            (status code, JSON body as bytes)
+        '''
+        loop = asyncio.get_running_loop()
+        #a changed generation means a loader wrote new rows, so every cached answer may be stale
+        generation = await loop.run_in_executor(None, self._read, data_generation)
+        if generation != self._generation:
+            self._responses.clear()
+            self._generation = generation
+        if path in self._responses:
+            self._responses.move_to_end(path)
+            return self._responses[path]
+        try:
+            status, body = await self._route(loop, path)
+        except ValueError as error:
+            status, body = 400, {"error": str(error)}
+        response = (status, json.dumps(body, ensure_ascii=False).encode("utf-8"))
+        #pending answers change as soon as the scrape lands, so only final answers are kept
+        if status in (200, 404):
+            self._responses[path] = response
+            while len(self._responses) > self.cache_size:
+                self._responses.popitem(last=False)
+        return response
+
+    async def _route(self, loop, path):
+        url = urllib.parse.urlsplit(path)
+        parts = [urllib.parse.unquote(part) for part in url.path.split("/") if part]
+        params = dict(urllib.parse.parse_qsl(url.query))
+        if parts == ["pokemon"] and "names" in params:
+            names = [name for name in params["names"].split(",") if name.strip()]
+            found = await loop.run_in_executor(None, self._read, self._lookup_many, names)
+            missing = [name for name in names if found[name] is None]
+            for name in missing:
+                await self._missing(loop, name)
+            return 200, {"pokemon": [pokemon for pokemon in found.values() if pokemon is not None], "missing": missing}
+        if len(parts) == 2 and parts[0] == "pokemon":
+            pokemon = await loop.run_in_executor(None, self._read, self._lookup, parts[1])
+            if pokemon is None:
+                return await self._missing(loop, parts[1])
+            return 200, pokemon
+        if parts == ["filter"]:
+            stat = params.get("stat", "speed")
+            sort = params.get("sort", stat)
+            if stat not in FILTER_COLUMNS or sort not in FILTER_COLUMNS:
+                raise ValueError("stat and sort must be one of " + ", ".join(FILTER_COLUMNS))
+            minimum = float(params["min"]) if "min" in params else None
+            maximum = float(params["max"]) if "max" in params else None
+            limit = int(params.get("limit", 50))
+            rows = await loop.run_in_executor(None, self._read, self._filter, stat, minimum, maximum, params.get("type"), sort, limit)
+            return 200, {"pokemon": rows}
+        if len(parts) == 3 and parts[0] == "chart":
+            if parts[2] not in STAT_VIEWS:
+                raise ValueError("view must be one of " + ", ".join(STAT_VIEWS))
+            pokemon = await loop.run_in_executor(None, self._read, self._lookup, parts[1])
+            if pokemon is None:
+                return await self._missing(loop, parts[1])
+            xvals, yvals = stat_view_data(pokemon, parts[2])
+            return 200, {"name": pokemon["name"], "view": parts[2], "title": STAT_VIEWS[parts[2]][0] + " Properties of " + pokemon["name"], "x": xvals[1:], "y": yvals[1:]}
+        if parts == ["team"] and "names" in params:
+            team = [name for name in params["names"].split(",") if name.strip()]
+            k = int(params.get("k", 5))
             try:
-                #get Pokemon data if the Pokemon is in Sword and Shield
-                print("Seeing if Pokemon exists in Sword and Shield")
-                instance = get_pokemon_instance(url)
-            except:
-                #if Pokemon is not in Sword and Shield, try the next Pokemon
-                print("Pokemon does not exist in Sword and Shield as of yet")
-            ct += 1
-            #once the 151 are checked, break out of the loop
-            if ct == 151:
-                break
-    #store everything to the Database
-    print("Establishing Database...")
-    store_pokemon_in_database1()
-    store_pokemon_in_database2()
-    return
+                report, candidates = await loop.run_in_executor(None, self._read, self._team, team, k)
+            except LookupError as error:
+                return 404, {"error": str(error)}
+            report["candidates"] = candidates
+            return 200, report
+        if len(parts) == 2 and parts[0] == "top":
+            k = int(params.get("k", 10))
+            leaders = await loop.run_in_executor(None, self._read, self._top, parts[1], k, params.get("lowest") == "1")
+            return 200, {"stat": parts[1], "pokemon": [{"name": name, "value": value} for (name, value) in leaders]}
+        if len(parts) == 2 and parts[0] == "rank":
+            try:
+                ranks = await loop.run_in_executor(None, self._read, self._ranks, parts[1])
+            except LookupError:
+                return await self._missing(loop, parts[1])
+            return 200, {"name": parts[1], "ranks": ranks}
+        if len(parts) == 2 and parts[0] == "types":
+            averages = await loop.run_in_executor(None, self._read, type_stat_averages, parts[1])
+            return 200, {"stat": parts[1], "types": averages}
+        if len(parts) == 2 and parts[0] == "diff":
+            first_game, second_game = params.get("from", DEFAULT_GAME), params.get("to", DEFAULT_GAME)
+            try:
+                changes = await loop.run_in_executor(None, self._read, self._diff, parts[1], first_game, second_game)
+            except LookupError as error:
+                return 404, {"error": str(error), "name": parts[1]}
+            return 200, {"name": parts[1], "from": first_game, "to": second_game, "changes": changes}
+        if len(parts) == 2 and parts[0] == "similar":
+            k = int(params.get("k", 5))
+            metric = params.get("metric", "euclidean")
+            try:
+                similar = await loop.run_in_executor(None, self._read, self._similar, parts[1], k, metric, params.get("type"))
+            except LookupError:
+                return await self._missing(loop, parts[1])
+            return 200, {"name": parts[1], "metric": metric, "similar": [{"name": name, "distance": distance} for (name, distance) in similar]}
+        return 404, {"error": "unknown endpoint"}
+
+    async def handle_connection(self, reader, writer):
+        '''Serve HTTP/1.1 requests on one connection until the client closes it'''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = header_line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                #request bodies are never used, but must be read to keep the connection in step
+                if int(headers.get("content-length", 0) or 0):
+                    await reader.readexactly(int(headers["content-length"]))
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                if method != "GET":
+                    status, body = 405, b'{"error": "only GET is supported"}'
+                else:
+                    try:
+                        status, body = await self.respond(path)
+                    except Exception as error:
+                        status, body = 500, json.dumps({"error": str(error)}).encode("utf-8")
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                head = "HTTP/1.1 " + str(status) + " " + HTTP_REASONS.get(status, "") + "\r\nContent-Type: application/json; charset=utf-8\r\nContent-Length: " + str(len(body)) + "\r\nConnection: " + ("keep-alive" if keep_alive else "close") + "\r\n\r\n"
+                writer.write(head.encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        '''Run the service until it is cancelled'''
+        #start loading the names now so the first unknown Pokemon doesn't wait for them
+        asyncio.ensure_future(self._names())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print("Serving the Pokedex on http://" + host + ":" + str(server.sockets[0].getsockname()[1]))
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._scraper.shutdown(wait=False)
+        self.pool.close()
+
+#########################################################
+######RECORDED FIXTURES AND OFFLINE BENCHMARKS###########
+#########################################################
+
+#one JSON object per benchmark run is appended here so runs can be compared
+BENCHMARK_FILENAME = "benchmark_results.jsonl"
+
+def record_fixtures(limit=151, fixture_dir=FIXTURE_DIR):
+    '''Download the pokemondb.net index and the first `limit` Serebii pages once and save them to disk,
+    so parsing and the benchmarks can be replayed without the live sites.
+
+    Parameters
+    ----------
+    limit: integer
+        How many Pokemon pages to record, in dex order
+    fixture_dir: string
+        Directory to record into. Pages go in fixture_dir/pages, with a manifest.json next to them.
+
+    Returns
+    -------
+    dict
+        the manifest that was written
+    '''
+    page_dir = os.path.join(fixture_dir, "pages")
+    os.makedirs(page_dir, exist_ok=True)
+    crawler = get_crawler()
+    index_text = crawler.fetch(POKEMONDB_URL)
+    with open(os.path.join(fixture_dir, "index.html"), "w", encoding="utf-8") as index_file:
+        index_file.write(index_text)
+    manifest = {"index_url": POKEMONDB_URL, "base_url": SEREBII_BASE_URL, "recorded_at": time.time(), "pages": {}, "missing": []}
+    urls = list(build_pokemon_dict().values())[:limit]
+    for url, page_text, error in crawler.crawl(urls):
+        if error is not None:
+            #pages that don't exist are replayed as 404s
+            manifest["missing"].append(url)
+            continue
+        filename = url.rstrip("/").split("/")[-1] + ".html"
+        with open(os.path.join(page_dir, filename), "w", encoding="utf-8", newline="") as page_file:
+            page_file.write(page_text)
+        manifest["pages"][url] = filename
+    with open(os.path.join(fixture_dir, "manifest.json"), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    print("Recorded the index and " + str(len(manifest["pages"])) + " pages (" + str(len(manifest["missing"])) + " missing) to " + fixture_dir)
+    return manifest
 
-###Run these functions before main
-make_pokemon_data_table()
-adding_first_151_to_database()
+
+class ReplayServer:
+    '''Local stand-in for pokemondb.net and Serebii that serves recorded fixtures over HTTP
+
+    Use it as a context manager. While it runs, index_url and base_url point at the replayed pages, and
+    add_stand_in() sends the downloads of Serebii pages to it:
+        with ReplayServer() as server:
+            add_stand_in(server.base_url)
+            build_pokemon_dict(server.index_url)
+
+    Instance Attributes
+    --------------
+    fixture_dir: string
+    Directory the fixtures were recorded into
+
+    index_url: string
+    Replayed pokemondb.net index page
+
+    base_url: string
+    Prefix of the replayed Serebii pages
+    '''
+
+    def __init__(self, fixture_dir=FIXTURE_DIR, port=0):
+        self.fixture_dir = fixture_dir
+        with open(os.path.join(fixture_dir, "manifest.json")) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        #every recorded url is served from the same path it had on the live site
+        routes = {urlparse(self.manifest["index_url"]).path: os.path.join(fixture_dir, "index.html")}
+        for url, filename in self.manifest["pages"].items():
+            routes[urlparse(url).path] = os.path.join(fixture_dir, "pages", filename)
+
+        class ReplayHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(handler):
+                filename = routes.get(urlparse(handler.path).path)
+                if filename is None:
+                    handler.send_error(404)
+                    return
+                with open(filename, "rb") as page_file:
+                    body = page_file.read()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/html; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            #keep the benchmark output readable
+            def log_message(handler, *args):
+                pass
+
+        #keep-alive like the real sites, and no Nagle delay between the headers and the body
+        ReplayHandler.protocol_version = "HTTP/1.1"
+        ReplayHandler.disable_nagle_algorithm = True
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", port), ReplayHandler)
+        self.httpd.daemon_threads = True
+        host, port = self.httpd.server_address[:2]
+        root = "http://" + host + ":" + str(port)
+        self.index_url = root + urlparse(self.manifest["index_url"]).path
+        self.base_url = root + urlparse(self.manifest["base_url"]).path
+        self._thread = None
+
+    def replay_url(self, live_url):
+        '''The replayed address of a url recorded from the live site'''
+        return self.base_url + live_url[len(self.manifest["base_url"]):]
+
+    def page_urls(self):
+        '''The Serebii url of every recorded page. add_stand_in(self.base_url) sends their downloads to this server.'''
+        return [SEREBII_BASE_URL + url[len(self.manifest["base_url"]):] for url in self.manifest["pages"]]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def timed(function, *args):
+    '''Call function(*args) and return (result, seconds taken)'''
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def run_benchmarks(fixture_dir=FIXTURE_DIR, results_filename=BENCHMARK_FILENAME):
+    '''Replay the recorded fixtures from a local server and time every stage of a database build separately:
+    building the name dictionary, fetching pages, parsing, cache writes and reads, the database loader
+    (cold and warm) and interactive lookups. Everything runs in a scratch directory, so the real
+    cache and database are never touched.
+
+    Parameters
+    ----------
+    fixture_dir: string
+        Directory the fixtures were recorded into
+    results_filename: string
+        File the results are appended to as one JSON line per run
+
+    Returns
+    -------
+    dict
+        the results of this run
+    '''
+    global CACHE_DICT, CRAWLER
+    fixture_dir = os.path.abspath(fixture_dir)
+    results_filename = os.path.abspath(results_filename)
+    saved_cache, saved_crawler, saved_cwd = CACHE_DICT, CRAWLER, os.getcwd()
+    scratch_dir = tempfile.mkdtemp(prefix="pokedex_bench_")
+    results = {"run_at": time.time(), "python": platform.python_version(), "parser": DEFAULT_PARSER, "stages": {}}
+    stages = results["stages"]
+    stand_in = None
+    try:
+        os.chdir(scratch_dir)
+        CACHE_DICT = {}
+        #the replay server is local, so there's no need to be polite
+        CRAWLER = PageCrawler(requests_per_second=0)
+        with ReplayServer(fixture_dir) as server:
+            #the recorded pages are fetched from the replay server but cached and loaded under their Serebii urls
+            stand_in = server.base_url
+            add_stand_in(stand_in)
+            pokemon_dict, seconds = timed(build_pokemon_dict, server.index_url)
+            stages["build_pokemon_dict"] = {"seconds": seconds, "names": len(pokemon_dict)}
+
+            urls = server.page_urls()
+            pages, seconds = timed(lambda: dict((url, text) for (url, text, error) in CRAWLER.crawl(urls) if error is None))
+            page_bytes = sum(len(text.encode("utf-8")) for text in pages.values())
+            stages["fetch"] = {"seconds": seconds, "pages": len(pages), "bytes": page_bytes}
+
+        #a recorded page that can't be parsed (a Pokemon missing from the game) is skipped like benchmark_parsers() does
+        parsed = {}
+        unreadable = 0
+        start = time.perf_counter()
+        for url, page_text in pages.items():
+            try:
+                parsed[url] = parse_pokemon_page(page_text).toJson()
+            except Exception:
+                unreadable += 1
+        seconds = time.perf_counter() - start
+        stages["parse"] = {"seconds": seconds, "pages": len(parsed), "ms_per_page": 1000 * seconds / max(len(parsed), 1), "unreadable": unreadable}
+
+        #cache writes one entry at a time, the way get_pokemon_instance() adds them
+        cache = open_cache()
+        start = time.perf_counter()
+        for url, value in parsed.items():
+            cache[url] = value
+        stages["cache_write"] = {"seconds": time.perf_counter() - start, "entries": len(parsed)}
+        #reads go through a fresh store so the in-memory layer starts cold
+        cache.close()
+        CACHE_DICT = {}
+        cache = open_cache()
+        start = time.perf_counter()
+        for url in parsed:
+            cache[url]
+        stages["cache_read"] = {"seconds": time.perf_counter() - start, "entries": len(parsed)}
+
+        #the same entries in the legacy double-encoded JSON file and in a packed snapshot
+        entries = cache.entries()
+        with open(CACHE_FILENAME, "w") as cache_file:
+            cache_file.write(json.dumps(dict((url, value) for (url, value, fetched_at) in entries)))
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(CACHE_FILENAME, "r") as cache_file:
+            legacy_cache = dict((url, json.loads(value)) for (url, value) in json.loads(cache_file.read()).items())
+        seconds = time.perf_counter() - start
+        allocated = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stages["cache_json_load"] = {"seconds": seconds, "entries": len(legacy_cache), "bytes": os.path.getsize(CACHE_FILENAME), "peak_kb": allocated / 1024}
+        _, seconds = timed(write_packed_cache, entries, PACKED_CACHE_FILENAME)
+        stages["cache_pack_write"] = {"seconds": seconds, "bytes": os.path.getsize(PACKED_CACHE_FILENAME)}
+        #opening the snapshot and summing every stat touches the whole cache without decoding any strings
+        tracemalloc.start()
+        start = time.perf_counter()
+        packed = PackedCache(PACKED_CACHE_FILENAME)
+        stat_total = int(packed.records["stats"].sum(dtype=np.int64))
+        seconds = time.perf_counter() - start
+        allocated = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stages["cache_pack_open"] = {"seconds": seconds, "entries": len(packed), "stat_total": stat_total, "peak_kb": allocated / 1024}
+        decoded, seconds = timed(lambda: [entry for entry in packed.entries()])
+        stages["cache_pack_decode"] = {"seconds": seconds, "entries": len(decoded)}
+        packed.close()
+
+        counts, seconds = timed(load_cache_into_database)
+        stages["load_database_cold"] = dict(counts, seconds=seconds)
+        counts, seconds = timed(load_cache_into_database)
+        stages["load_database_warm"] = dict(counts, seconds=seconds)
+
+        query = PokedexQuery()
+        names = [json.loads(value)["name"] for value in parsed.values()]
+        latencies = []
+        for name in names:
+            start = time.perf_counter()
+            query.lookup(name)
+            latencies.append(time.perf_counter() - start)
+        query.close()
+        latencies.sort()
+        if latencies:
+            stages["lookup"] = {"lookups": len(latencies), "mean_us": 1e6 * sum(latencies) / len(latencies), "p50_us": 1e6 * latencies[len(latencies) // 2], "p95_us": 1e6 * latencies[int(len(latencies) * 0.95)]}
+        cache.close()
+    finally:
+        os.chdir(saved_cwd)
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        CACHE_DICT, CRAWLER = saved_cache, saved_crawler
+        if stand_in is not None:
+            remove_stand_in(stand_in)
+
+    previous = None
+    if os.path.exists(results_filename):
+        with open(results_filename) as results_file:
+            lines = [line for line in results_file if line.strip()]
+        if lines:
+            previous = json.loads(lines[-1])
+    with open(results_filename, "a") as results_file:
+        results_file.write(json.dumps(results) + "\n")
+    print_benchmark(results, previous)
+    return results
+
+def print_benchmark(results, previous=None):
+    '''Print a benchmark run, with the change from the previous run when there is one'''
+    for stage, numbers in results["stages"].items():
+        seconds = numbers.get("seconds")
+        if seconds is None:
+            line = stage + ": mean " + format(numbers["mean_us"], ".1f") + "us, p95 " + format(numbers["p95_us"], ".1f") + "us"
+            old = previous and previous["stages"].get(stage, {}).get("mean_us")
+            new = numbers["mean_us"]
+        else:
+            line = stage + ": " + format(seconds, ".4f") + "s"
+            if numbers.get("unreadable"):
+                line += ", " + str(numbers["unreadable"]) + " unreadable pages skipped"
+            old = previous and previous["stages"].get(stage, {}).get("seconds")
+            new = seconds
+        if old:
+            line += " (" + format(100 * (new - old) / old, "+.1f") + "% vs previous run)"
+        print(line)
 
 ##############################
 ########MAIN FUNCTION#########
 ##############################
 if __name__ == "__main__":
+    #games listed in games.json are registered first so --game accepts them
+    load_games()
+    ###command line options. With none of them the interactive prompt runs as usual.
+    arg_parser = argparse.ArgumentParser(description="Serebii Pokedex Web Scraper")
+    arg_parser.add_argument("--benchmark-parsers", nargs="?", const=FIXTURE_DIR, metavar="DIR", help="time every html parser backend over the pages in DIR/pages (default " + FIXTURE_DIR + ", or " + PARSER_FIXTURE_DIR + " for the pages kept in the repository), and exit with status 1 if any backend disagrees with html.parser")
+    arg_parser.add_argument("--record-fixtures", type=int, metavar="N", help="record the index and the first N Serebii pages into " + FIXTURE_DIR + " and exit")
+    arg_parser.add_argument("--benchmark", action="store_true", help="replay the recorded fixtures locally, time every stage, append the results to " + BENCHMARK_FILENAME + " and exit")
+    arg_parser.add_argument("--report", nargs="*", metavar="NAME", help="write every stat view for the named Pokemon (or the whole database when no names are given) to a static site in " + REPORT_DIR + " and exit")
+    arg_parser.add_argument("--batch", metavar="FILE", help="look up every name in FILE (one per line, - for stdin), stream the results to stdout and exit")
+    arg_parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl", help="output format for --batch (default jsonl)")
+    arg_parser.add_argument("--errors", metavar="FILE", help="where --batch writes names it could not resolve (default stderr)")
+    arg_parser.add_argument("--serve", nargs="?", const=SERVICE_PORT, type=int, metavar="PORT", help="serve the Pokedex as JSON over HTTP on " + SERVICE_HOST + " (default port " + str(SERVICE_PORT) + ")")
+    arg_parser.add_argument("--crawl", action="store_true", help="crawl every Pokemon not handled yet into the cache and database, resuming any earlier crawl, and exit")
+    arg_parser.add_argument("--range", metavar="FIRST-LAST", help="with --crawl, only crawl these dex positions, e.g. 152-251")
+    arg_parser.add_argument("--retry-failed", action="store_true", help="with --crawl, also retry pages that already failed " + str(CRAWL_MAX_ATTEMPTS) + " times")
+    arg_parser.add_argument("--limit", type=int, metavar="N", help="with --crawl or --refresh, handle at most N pages this run")
+    arg_parser.add_argument("--profile", action="store_true", help="time every stage (network, parsing, cache, database, plotting) and print a summary at exit")
+    arg_parser.add_argument("--profile-trace", metavar="FILE", help="with --profile, also write a Chrome trace of every timed stage to FILE")
+    arg_parser.add_argument("--similar", metavar="NAME", help="list the Pokemon whose base stats are closest to NAME's and exit")
+    arg_parser.add_argument("--all-pairs", action="store_true", help="write the nearest Pokemon of every Pokemon in the database to stdout as JSON lines and exit")
+    arg_parser.add_argument("--team", metavar="NAME,NAME,...", help="print the type coverage of a team of up to six Pokemon and the best candidates to add, then exit")
+    arg_parser.add_argument("--k", type=int, default=5, help="with --similar, --all-pairs or --team, how many Pokemon to list (default 5)")
+    arg_parser.add_argument("--metric", choices=SimilarityIndex.METRICS, default="euclidean", help="with --similar or --all-pairs, how stats are compared (default euclidean)")
+    arg_parser.add_argument("--type", metavar="TYPE", help="with --similar or --all-pairs, only compare Pokemon of this type")
+    arg_parser.add_argument("--pack-cache", nargs="?", const=PACKED_CACHE_FILENAME, metavar="FILE", help="write a packed, memory-mappable snapshot of the cache to FILE (default " + PACKED_CACHE_FILENAME + ") and exit")
+    arg_parser.add_argument("--from-json", metavar="FILE", help="with --pack-cache, convert this legacy JSON cache instead of the cache store")
+    arg_parser.add_argument("--load-pack", metavar="FILE", help="load the Pokemon in a packed snapshot into the database and exit")
+    arg_parser.add_argument("--refresh", action="store_true", help="revalidate cached Pokemon against Serebii, re-storing only the ones that changed, and exit")
+    arg_parser.add_argument("--max-age", type=float, default=0, metavar="DAYS", help="with --refresh, only revalidate entries last checked more than DAYS days ago")
+    arg_parser.add_argument("--top", metavar="STAT", help="list the Pokemon with the highest STAT (" + ", ".join(LEADERBOARD_STATS) + ") and exit. --k sets how many.")
+    arg_parser.add_argument("--rank", metavar="NAME", help="print where a Pokemon ranks in every stat and exit")
+    arg_parser.add_argument("--type-averages", metavar="STAT", help="print the average of STAT for every type and exit")
+    arg_parser.add_argument("--game", choices=list(GAMES), default=DEFAULT_GAME, help="with --crawl, which game's Pokedex to crawl (default " + DEFAULT_GAME + ")")
+    arg_parser.add_argument("--stand-in", metavar="URL", help="with --crawl, fetch the game's pages from a local server at URL (e.g. http://127.0.0.1:8000/pokedex-swsh/) instead of Serebii")
+    arg_parser.add_argument("--diff", nargs=3, metavar=("NAME", "GAME", "GAME"), help="print what changed for a Pokemon between two crawled games and exit")
+    arg_parser.add_argument("--changes", nargs=2, metavar=("GAME", "GAME"), help="list every Pokemon whose stats or details differ between two crawled games and exit")
+    args = arg_parser.parse_args()
+    if args.profile or args.profile_trace:
+        PROFILER.enable(trace=bool(args.profile_trace))
+        atexit.register(PROFILER.print_summary)
+        if args.profile_trace:
+            atexit.register(PROFILER.write_trace, args.profile_trace)
+    if args.record_fixtures:
+        record_fixtures(args.record_fixtures)
+        quit()
+    if args.benchmark_parsers:
+        results = benchmark_parsers(args.benchmark_parsers)
+        sys.exit(1 if any(result["mismatches"] for result in results.values()) else 0)
+    if args.benchmark:
+        run_benchmarks()
+        quit()
+    if args.report is not None:
+        sync_database(allow_network=False)
+        generate_report(args.report or None)
+        quit()
+    if args.similar or args.all_pairs:
+        with contextlib.redirect_stdout(sys.stderr):
+            sync_database(allow_network=False)
+        similarity_index = get_similarity_index()
+        if args.similar:
+            try:
+                for similar_name, distance in similarity_index.neighbours(args.similar, args.k, args.metric, args.type):
+                    print(format(similar_name, "<16") + format(distance, ".3f"))
+            except LookupError as error:
+                print("[Error] " + str(error), file=sys.stderr)
+        else:
+            for pokemon_name, neighbours in similarity_index.all_pairs(args.k, args.metric, args.type):
+                print(json.dumps({"name": pokemon_name, "similar": [{"name": similar_name, "distance": round(distance, 4)} for (similar_name, distance) in neighbours]}, ensure_ascii=False))
+        quit()
+    if args.top or args.rank or args.type_averages:
+        with contextlib.redirect_stdout(sys.stderr):
+            sync_database(allow_network=False)
+        conn = open_database()
+        try:
+            if args.top:
+                for position, (pokemon_name, value) in enumerate(get_leaderboards(conn).top(args.top, args.k), 1):
+                    print(format(position, ">3") + ". " + format(pokemon_name, "<16") + str(value))
+            elif args.rank:
+                for stat, rank in get_leaderboards(conn).ranks(args.rank).items():
+                    if rank is not None:
+                        print(format(stat, "<16") + format(rank["value"], ">4") + "  #" + str(rank["rank"]) + " of " + str(rank["out_of"]) + "  " + format(rank["percentile"], ".1f") + " percentile")
+            else:
+                for average in type_stat_averages(conn, args.type_averages):
+                    print(format(average["type"], "<10") + format(average["count"], ">5") + format(average["mean"], ">9.1f") + " +/- " + format(average["std"], ".1f"))
+        except (LookupError, ValueError) as error:
+            print("[Error] " + str(error), file=sys.stderr)
+        conn.close()
+        quit()
+    if args.diff or args.changes:
+        with contextlib.redirect_stdout(sys.stderr):
+            sync_database(allow_network=False)
+        conn = open_database()
+        try:
+            if args.diff:
+                pokemon_name, first_game, second_game = args.diff
+                changes = game_diff(conn, pokemon_name, first_game, second_game)
+                if not changes:
+                    print(pokemon_name.title() + " is the same in " + GAMES[first_game].title + " and " + GAMES[second_game].title)
+                for field, (old_value, new_value) in changes.items():
+                    print(format(field, "<16") + str(old_value) + " -> " + str(new_value))
+            else:
+                for pokemon_name in game_changes(conn, *args.changes):
+                    print(pokemon_name)
+                storage = game_storage(conn)
+                print(", ".join((GAMES[game].title if game in GAMES else game) + " " + str(count) for (game, count) in sorted(storage["games"].items())) + " Pokemon sharing " + str(storage["stat_records"]) + " stat and " + str(storage["info_records"]) + " detail records", file=sys.stderr)
+        except (LookupError, ValueError) as error:
+            print("[Error] " + str(error), file=sys.stderr)
+        conn.close()
+        quit()
+    if args.team:
+        with contextlib.redirect_stdout(sys.stderr):
+            sync_database(allow_network=False)
+        team = [name.strip() for name in args.team.split(",") if name.strip()]
+        try:
+            type_matchups = get_type_matchups()
+            report = type_matchups.team_report(team)
+            candidates = type_matchups.score_candidates(team, args.k)
+        except LookupError as error:
+            print("[Error] " + str(error), file=sys.stderr)
+            quit()
+        print("Team: " + ", ".join(report["team"]))
+        print(format("attack type", "<12") + format("weak", ">6") + format("resist", ">8") + format("immune", ">8"))
+        for type_name, counts in report["types"].items():
+            print(format(type_name, "<12") + format(counts["weak"], ">6") + format(counts["resist"], ">8") + format(counts["immune"], ">8"))
+        print("Weak to: " + (", ".join(report["weaknesses"]) or "nothing"))
+        print("Hits " + format(report["super_effective"], ".0%") + " of the Pokedex super effectively")
+        print("Best additions:")
+        for candidate in candidates:
+            print("  " + format(candidate["name"], "<16") + format(candidate["score"], ".2f"))
+        quit()
+    if args.pack_cache:
+        count = pack_cache(args.pack_cache, args.from_json)
+        print("Packed " + str(count) + " Pokemon into " + args.pack_cache + " (" + str(os.path.getsize(args.pack_cache)) + " bytes)")
+        quit()
+    if args.load_pack:
+        try:
+            with PackedCache(args.load_pack) as packed:
+                print_load_report(load_cache_into_database(cache_entries=packed.entries()))
+        except ValueError as error:
+            print("[Error] " + str(error))
+        quit()
+    if args.refresh:
+        open_database().close()
+        run_refresh(args.max_age * 24 * 60 * 60, args.limit)
+        quit()
+    if args.crawl:
+        first, last = None, None
+        if args.range:
+            first, _, last = args.range.partition("-")
+            first, last = int(first or 1), int(last) if last else None
+        open_database().close()
+        run_crawl(first, last, args.limit, game=args.game, retry_failed=args.retry_failed, stand_in=args.stand_in)
+        quit()
+    if args.serve:
+        sync_database(allow_network=False)
+        service = PokedexService()
+        try:
+            asyncio.run(service.serve(SERVICE_HOST, args.serve))
+        except KeyboardInterrupt:
+            print("Thanks for using my program!")
+        finally:
+            service.close()
+        quit()
+    if args.batch:
+        names_file = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+        error_file = sys.stderr if args.errors is None else open(args.errors, "w", encoding="utf-8", newline="")
+        with contextlib.redirect_stdout(sys.stderr):
+            sync_database(allow_network=False)
+        counts = run_batch(names_file, sys.stdout, error_file, args.format)
+        print(str(counts["resolved"]) + " resolved, " + str(counts["failed"]) + " failed, " + str(counts["duplicates"]) + " duplicates skipped", file=sys.stderr)
+        quit()
     ###user prompted to enter a Pokemon name or exit
+    #bring the database up to date first. A complete database starts without touching the network.
+    sync_database()
+    #one connection to the PokemonData database serves every lookup
+    pokedex_query = PokedexQuery()
+    enable_name_completion()
     user_input = input('Enter a Pokemon name (e.g. Pikachu, pikachu), or "exit" to quit:').lower()
-    #make a dictionary of state names to abbreviations
-    pokemon_dictionary = build_pokemon_dict()
     #keep repeating function until user types exit
     while user_input != "exit":
-        #connect to the PokemonData database
-        conn = sqlite3.connect("PokemonData.sqlite")
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM Pokemon INNER JOIN Pokemon_Extra ON Pokemon.name=Pokemon_Extra.name")
-        rows = cur.fetchall()
         #checking database to see if pokemon name is present
-        for row in rows:
-            if user_input.capitalize() == row[0]:
-                print("Retrieved " + user_input.capitalize() + " from Database")
-                pokemon_from_database = row
-                #new input
-                #takes inputs of physical, special, offensive, or defensive stats and displays as a barplot. extra shows height/weight.
-                #continue checks outside of the database for more Pokemon. exit terminates the program.
-                db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "continue" to check outside of the database, or "exit" to quit:').lower()
-                while db_five_opt_user_input:
-                    #exit quits out
-                    if db_five_opt_user_input == "exit":
-                        print("Thanks for using my program!")
-                        quit()
-                    #continue proceeds to checking outside of the database (checks cache/validity of new Pokemon)
-                    elif db_five_opt_user_input == "continue":
-                        user_input = input('Enter a Pokemon name (e.g. Pikachu, pikachu), or "exit" to quit:').lower()
-                        break
-                    #physical stats attack and defense are plotted in a bar graph and displayed in html
-                    elif db_five_opt_user_input == 'physical':
-                        print('Creating graph of Pokemon physical attributes')
-                        xvals = ['stat', 'attack', 'defense']
-                        yvals = [' ', pokemon_from_database[4], pokemon_from_database[5]]
-                        bar_data = go.Bar(x=xvals,y=yvals)
-                        basic_layout = go.Layout(title=pokemon_from_database[0])
-                        fig=go.Figure(data=bar_data, layout_title_text="Physical Properties of" + ' ' + pokemon_from_database[0])
-                        fig.show()
-                        db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "continue" to check outside of the database, or "exit" to quit:').lower()
-                    #special stats special_attack and special_defense are plotted in a bar graph and displayed in html
-                    elif db_five_opt_user_input == 'special':
-                        print('Creating graph of Pokemon special attributes')
-                        xvals = ['stat', 'special attack', 'special defense']
-                        yvals = [' ', pokemon_from_database[6], pokemon_from_database[7]]
-                        bar_data = go.Bar(x=xvals,y=yvals)
-                        basic_layout = go.Layout(title=pokemon_from_database[0])
-                        fig=go.Figure(data=bar_data, layout_title_text="Special Properties of" + ' ' + pokemon_from_database[0])
-                        fig.show()
-                        db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "continue" to check outside of the database, or "exit" to quit:').lower()
-                    #offensive stats attack, special_attack, and speed are plotted in a bar graph and displayed in html
-                    elif db_five_opt_user_input == 'offense':
-                        print('Creating graph of Pokemon offensive attributes')
-                        xvals = ['stat', 'attack', 'special_attack', 'speed']
-                        yvals = [' ', pokemon_from_database[4], pokemon_from_database[6], pokemon_from_database[8]]
-                        bar_data = go.Bar(x=xvals,y=yvals)
-                        basic_layout = go.Layout(title=pokemon_from_database[0])
-                        fig=go.Figure(data=bar_data, layout_title_text="Offensive Properties of" + ' ' + pokemon_from_database[0])
-                        fig.show()
-                        db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "continue" to check outside of the database, or "exit" to quit:').lower()
-                    #defensive stats hp, defense, and speed are plotted in a bar graph and displayed in html
-                    elif db_five_opt_user_input == 'defense':
-                        print('Creating graph of Pokemon defensive attributes')
-                        xvals = ['stat', 'hp', 'defense', 'special_defense']
-                        yvals = [' ', pokemon_from_database[3], pokemon_from_database[5], pokemon_from_database[7]]
-                        bar_data = go.Bar(x=xvals,y=yvals)
-                        basic_layout = go.Layout(title=pokemon_from_database[0])
-                        fig=go.Figure(data=bar_data, layout_title_text="Defensive Properties of" + ' ' + pokemon_from_database[0])
+        pokemon_from_database = pokedex_query.lookup(user_input)
+        if pokemon_from_database is not None:
+            print("Retrieved " + pokemon_from_database[0] + " from Database")
+            #new input
+            #takes inputs of physical, special, offensive, or defensive stats and displays as a barplot. extra shows height/weight.
+            #continue checks outside of the database for more Pokemon. exit terminates the program.
+            db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "similar" to list Pokemon with similar stats, "rank" to compare against every Pokemon, "continue" to check outside of the database, or "exit" to quit:').lower()
+            while db_five_opt_user_input:
+                #exit quits out
+                if db_five_opt_user_input == "exit":
+                    print("Thanks for using my program!")
+                    quit()
+                #continue proceeds to checking outside of the database (checks cache/validity of new Pokemon)
+                elif db_five_opt_user_input == "continue":
+                    user_input = input('Enter a Pokemon name (e.g. Pikachu, pikachu), or "exit" to quit:').lower()
+                    break
+                #physical, special, offensive, defensive and extra stats are plotted in a bar graph and displayed in html
+                elif db_five_opt_user_input in STAT_VIEWS:
+                    print('Creating graph of Pokemon ' + STAT_VIEWS[db_five_opt_user_input][1])
+                    fig = make_stat_figure(database_row_to_dict(pokemon_from_database), db_five_opt_user_input, "Properties")
+                    with PROFILER.stage("plot render"):
                         fig.show()
-                        db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "continue" to check outside of the database, or "exit" to quit:').lower()
-                    #height and weight are plotted in a bar graph and displayed in html
-                    elif db_five_opt_user_input == 'extra':
-                        print('Creating graph of Pokemon extra properties')
-                        xvals = ['stat', 'height', 'weight']
-                        yvals = [' ', pokemon_from_database[10], pokemon_from_database[11]]
-                        bar_data = go.Bar(x=xvals,y=yvals)
-                        basic_layout = go.Layout(title=pokemon_from_database[0])
-                        fig=go.Figure(data=bar_data, layout_title_text="Extra Properties of" + ' ' + pokemon_from_database[0])
+                    db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "similar" to list Pokemon with similar stats, "rank" to compare against every Pokemon, "continue" to check outside of the database, or "exit" to quit:').lower()
+                #similar lists the Pokemon whose six base stats are closest
+                elif db_five_opt_user_input == "similar":
+                    for similar_name, distance in get_similarity_index(pokedex_query.conn).neighbours(pokemon_from_database[0]):
+                        print("  " + similar_name + " (distance " + format(distance, ".2f") + ")")
+                    db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "similar" to list Pokemon with similar stats, "rank" to compare against every Pokemon, "continue" to check outside of the database, or "exit" to quit:').lower()
+                #rank prints where the Pokemon stands in every stat and charts it against the whole database
+                elif db_five_opt_user_input == "rank":
+                    leaderboards = get_leaderboards(pokedex_query.conn)
+                    for stat, rank in leaderboards.ranks(pokemon_from_database[0]).items():
+                        if rank is not None:
+                            print("  " + format(stat.replace("_", " ").title(), "<16") + format(rank["value"], ">4") + "  #" + str(rank["rank"]) + " of " + str(rank["out_of"]) + ", higher than " + format(rank["percentile"], ".0f") + "%")
+                    fig = make_distribution_figure(pokemon_from_database[0], leaderboards)
+                    with PROFILER.stage("plot render"):
                         fig.show()
-                        db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "continue" to check outside of the database, or "exit" to quit:').lower()
-                    #invalid input
-                    else:
-                        print("[Error] Enter an applicable stat display")
-                        db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "continue" to check outside of the database, or "exit" to quit:').lower()
+                    db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "similar" to list Pokemon with similar stats, "rank" to compare against every Pokemon, "continue" to check outside of the database, or "exit" to quit:').lower()
+                #invalid input
+                else:
+                    print("[Error] Enter an applicable stat display")
+                    db_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "similar" to list Pokemon with similar stats, "rank" to compare against every Pokemon, "continue" to check outside of the database, or "exit" to quit:').lower()
         #if pokemon not in database, check the complete pokedex
-        if user_input in pokemon_dictionary:
-            pokemon_url = pokemon_dictionary[user_input]
+        #the name to url dictionary is only downloaded the first time it is needed
+        pokemon_dictionary = get_pokemon_dictionary()
+        if normalize_name(user_input) in pokemon_dictionary:
+            pokemon_url = pokemon_dictionary[normalize_name(user_input)]
             print("Seeing if Pokemon is in Cache")
             #checking if pokemon is actually in the Sword and Shield game presently
             try:
                 pokemon_info = get_pokemon_instance(pokemon_url)
-            except:
+            except PokemonNotInGame:
                 print("Pokemon does not exist in Sword and Shield as of yet. Try a different Pokemon.")
+            except requests.RequestException as error:
+                print("[Error] Could not reach Serebii (" + str(error) + "). Try again in a moment.")
             #proceeding if pokemon_url is valid in Sword and Shield
             else:
                 #loading it into dictionary form for more convenience in plotting
@@ -485,55 +4668,12 @@ if __name__ == "__main__":
                     elif standard_five_opt_user_input == "exit":
                         print("Thanks for using my program!")
                         exit()
-                    #physical stats attack and defense are plotted in a bar graph and displayed in html
-                    elif standard_five_opt_user_input == 'physical':
-                        print('Creating graph of Pokemon physical attributes')
-                        xvals = ['stat', 'attack', 'defense']
-                        yvals = [' ', pokemon_info_dict['attack'], pokemon_info_dict['defense']]
-                        bar_data = go.Bar(x=xvals,y=yvals)
-                        basic_layout = go.Layout(title=pokemon_info_dict['name'])
-                        fig=go.Figure(data=bar_data, layout_title_text="Physical Stats of" + ' ' + pokemon_info_dict['name'])
-                        fig.show()
-                        standard_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "back" to choose another Pokemon, or "exit" to quit:').lower()
-                    #special stats special_attack and special_defense are plotted in a bar graph and displayed in html
-                    elif standard_five_opt_user_input == 'special':
-                        print('Creating graph of Pokemon special attributes')
-                        xvals = ['stat', 'special attack', 'special defense']
-                        yvals = [' ', pokemon_info_dict['special_attack'], pokemon_info_dict['special_defense']]
-                        bar_data = go.Bar(x=xvals,y=yvals)
-                        basic_layout = go.Layout(title=pokemon_info_dict['name'])
-                        fig=go.Figure(data=bar_data, layout_title_text="Special Stats of" + ' ' + pokemon_info_dict['name'])
-                        fig.show()
-                        standard_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "back" to choose another Pokemon, or "exit" to quit:').lower()
-                    #offensive stats attack, special_attack, and speed are plotted in a bar graph and displayed in html
-                    elif standard_five_opt_user_input == 'offense':
-                        print('Creating graph of Pokemon offensive attributes')
-                        xvals = ['stat', 'attack', 'special_attack', 'speed']
-                        yvals = [' ', pokemon_info_dict['attack'], pokemon_info_dict['special_attack'], pokemon_info_dict['speed']]
-                        bar_data = go.Bar(x=xvals,y=yvals)
-                        basic_layout = go.Layout(title=pokemon_info_dict['name'])
-                        fig=go.Figure(data=bar_data, layout_title_text="Offensive Stats of" + ' ' + pokemon_info_dict['name'])
-                        fig.show()
-                        standard_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "back" to choose another Pokemon, or "exit" to quit:').lower()
-                    #defensive stats hp, defense, and speed are plotted in a bar graph and displayed in html
-                    elif standard_five_opt_user_input == 'defense':
-                        print('Creating graph of Pokemon defensive attributes')
-                        xvals = ['stat', 'hp', 'defense', 'special_defense']
-                        yvals = [' ', pokemon_info_dict['hp'], pokemon_info_dict['defense'], pokemon_info_dict['special_defense']]
-                        bar_data = go.Bar(x=xvals,y=yvals)
-                        basic_layout = go.Layout(title=pokemon_info_dict['name'])
-                        fig=go.Figure(data=bar_data, layout_title_text="Defensive Stats of" + ' ' + pokemon_info_dict['name'])
-                        fig.show()
-                        standard_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "back" to choose another Pokemon, or "exit" to quit:').lower()
-                    #height and weight are plotted in a bar graph and displayed in html
-                    elif standard_five_opt_user_input == 'extra':
-                        print('Creating graph of Pokemon extra properties')
-                        xvals = ['stat', 'height', 'weight']
-                        yvals = [' ', pokemon_info_dict['height'], pokemon_info_dict['weight']]
-                        bar_data = go.Bar(x=xvals,y=yvals)
-                        basic_layout = go.Layout(title=pokemon_info_dict['name'])
-                        fig=go.Figure(data=bar_data, layout_title_text="Extra Properties of" + ' ' + pokemon_info_dict['name'])
-                        fig.show()
+                    #physical, special, offensive, defensive and extra stats are plotted in a bar graph and displayed in html
+                    elif standard_five_opt_user_input in STAT_VIEWS:
+                        print('Creating graph of Pokemon ' + STAT_VIEWS[standard_five_opt_user_input][1])
+                        fig = make_stat_figure(pokemon_info_dict, standard_five_opt_user_input, "Stats")
+                        with PROFILER.stage("plot render"):
+                            fig.show()
                         standard_five_opt_user_input = input('Enter Physical, Special, Offense, Defense, Extra, "back" to choose another Pokemon, or "exit" to quit:').lower()
                     #invalid input
                     else:
@@ -542,4 +4682,7 @@ if __name__ == "__main__":
         #if not a pokemon or command
         else:
             print("[Error] Enter proper Pokemon name")
+            suggestions = get_name_index().suggest(user_input)
+            if suggestions:
+                print("Did you mean: " + ", ".join(name.title() for name in suggestions) + "?")
         user_input = input('Enter a Pokemon name (e.g. Pikachu, pikachu), or "exit" to quit:').lower()
\ No newline at end of file
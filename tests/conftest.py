@@ -0,0 +1,109 @@
+import importlib.util
+import json
+import os
+import socket
+import time
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "507_FinalProject_shinkris.py")
+
+#a Serebii Pokedex page cut down to the cells parse_pokemon_page() reads
+PAGE_TEMPLATE = '''<html>
+<head><title>{name} - Serebii.net Pokedex</title></head>
+<body>
+<table class="dextable">
+<tr>
+<td class="fooinfo">Name</td><td class="fooinfo">{name}</td><td class="fooinfo">Other Names</td>
+<td class="fooinfo">National: #{dex:03d}</td><td class="fooinfo">Male ♂:50%Female ♀:50%</td><td class="fooinfo">{classification}</td>
+<td class="fooinfo">1'04" 0.4m</td><td class="fooinfo">13.2lbs 6.0kg</td>
+</tr>
+</table>
+<div>{types}</div>
+<a name="stats"></a><table class="dextable">
+<tr><td>h0</td><td>h1</td><td>h2</td><td>h3</td><td>h4</td><td>h5</td><td>h6</td><td>h7</td><td>h8</td></tr>
+<tr>{stats}</tr>
+</table>
+</body>
+</html>
+'''
+
+#name, dex number, types, (hp, attack, defense, special attack, special defense, speed)
+POKEMON = [
+    ("Bulbasaur", 1, ("Grass", "Poison"), (45, 49, 49, 65, 65, 45)),
+    ("Charizard", 6, ("Fire", "Flying"), (78, 84, 78, 109, 85, 100)),
+    ("Squirtle", 7, ("Water",), (44, 48, 65, 50, 64, 43)),
+    ("Pikachu", 25, ("Electric",), (35, 55, 40, 50, 50, 90)),
+]
+#listed on the index but without a page, like a Pokemon left out of the game
+MISSING = ["Missingno"]
+
+
+@pytest.fixture(scope="session")
+def pokedex():
+    '''The script loaded as a module. Its file name starts with a digit, so it can't simply be imported.'''
+    spec = importlib.util.spec_from_file_location("pokedex", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_page(name, dex, types, stats, classification="Test Pokémon"):
+    type_images = "".join('<img class="typeimg" alt="' + type_name + '-type" src="/pokedex-bw/type/' + type_name.lower() + '.gif">' for type_name in types)
+    stat_cells = "".join('<td align="center">' + str(stat) + '</td>' for stat in stats)
+    return PAGE_TEMPLATE.format(name=name, dex=dex, classification=classification, types=type_images, stats=stat_cells)
+
+
+def write_fixtures(fixture_dir, base_url, pokemon=POKEMON, missing=MISSING, index_url="https://pokemondb.net/pokedex/all"):
+    '''Write a fixture directory in the layout record_fixtures() makes, for ReplayServer to serve'''
+    os.makedirs(os.path.join(fixture_dir, "pages"), exist_ok=True)
+    names = [entry[0] for entry in sorted(pokemon, key=lambda entry: entry[1])] + list(missing)
+    links = "".join('<a class="ent-name" href="/pokedex/' + name.lower() + '">' + name + '</a>\n' for name in names)
+    with open(os.path.join(fixture_dir, "index.html"), "w", encoding="utf-8") as index_file:
+        index_file.write("<html><body>\n" + links + "</body></html>\n")
+    manifest = {"index_url": index_url, "base_url": base_url, "recorded_at": time.time(), "pages": {}, "missing": []}
+    for name, dex, types, stats in pokemon:
+        filename = name.lower() + ".html"
+        with open(os.path.join(fixture_dir, "pages", filename), "w", encoding="utf-8") as page_file:
+            page_file.write(make_page(name, dex, types, stats))
+        manifest["pages"][base_url + name.lower()] = filename
+    with open(os.path.join(fixture_dir, "manifest.json"), "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+    return fixture_dir
+
+
+def unused_url():
+    '''Base url of a local port nothing listens on, so every request to it fails to connect'''
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    return "http://127.0.0.1:" + str(port) + "/pokedex-swsh/"
+
+
+@pytest.fixture
+def workdir(pokedex, tmp_path, monkeypatch):
+    '''Run in an empty directory with none of the module's caches, crawler or indexes carried over'''
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pokedex, "CACHE_DICT", {})
+    #the fixtures are local, so there is no need to be polite or to wait between retries
+    monkeypatch.setattr(pokedex, "CRAWLER", pokedex.PageCrawler(requests_per_second=0, max_retries=1, backoff=0))
+    monkeypatch.setattr(pokedex, "GAMES", dict(pokedex.GAMES))
+    monkeypatch.setattr(pokedex, "STAND_INS", {})
+    for name in ("POKEMON_DICTIONARY", "NAME_INDEX", "SIMILARITY_INDEX", "TYPE_MATCHUPS", "LEADERBOARDS"):
+        monkeypatch.setattr(pokedex, name, None)
+    monkeypatch.setattr(pokedex, "GAME_DICTIONARIES", {})
+    yield tmp_path
+    if isinstance(pokedex.CACHE_DICT, pokedex.CacheStore):
+        pokedex.CACHE_DICT.close()
+
+
+@pytest.fixture
+def replay(pokedex, workdir):
+    '''A ReplayServer standing in for pokemondb.net and Sword and Shield, with the name list already saved'''
+    fixture_dir = write_fixtures(str(workdir / "fixtures"), pokedex.SEREBII_BASE_URL)
+    with pokedex.ReplayServer(fixture_dir) as server:
+        pokedex.add_stand_in(server.base_url)
+        names = pokedex.build_pokemon_dict(server.index_url)
+        with open(pokedex.NAME_INDEX_FILENAME, "w", encoding="utf-8") as names_file:
+            json.dump({"fetched_at": time.time(), "names": names}, names_file)
+        yield server
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import sqlite3
+
+from conftest import MISSING, POKEMON, make_page, unused_url, write_fixtures
+
+
+def crawl_states(pokedex):
+    job = pokedex.CrawlJob()
+    try:
+        return dict(job.conn.execute("SELECT url, status FROM Crawl_State").fetchall())
+    finally:
+        job.close()
+
+
+def test_crawl_caches_pages_under_serebii_urls(pokedex, replay):
+    summary = pokedex.run_crawl()
+    assert summary == {pokedex.CRAWL_OK: len(POKEMON), pokedex.CRAWL_NOT_IN_GAME: len(MISSING)}
+    cache = pokedex.open_cache()
+    assert sorted(cache) == sorted(pokedex.SEREBII_BASE_URL + name.lower() for (name, _, _, _) in POKEMON)
+    conn = pokedex.open_database()
+    assert conn.execute("SELECT speed FROM Pokemon WHERE name_key = 'pikachu'").fetchone() == (90,)
+    conn.close()
+
+
+def test_crawl_remembers_absent_pages(pokedex, replay):
+    pokedex.run_crawl()
+    url = pokedex.SEREBII_BASE_URL + MISSING[0].lower()
+    absent = pokedex.open_cache().absent(url)
+    assert absent is not None and absent.reason == pokedex.ABSENT_NOT_FOUND
+    assert crawl_states(pokedex)[url] == pokedex.CRAWL_NOT_IN_GAME
+    #a second run knows the page is missing and fetches nothing
+    fetched = []
+    real_get = pokedex.CRAWLER._get
+    pokedex.CRAWLER._get = lambda url, headers=None: fetched.append(url) or real_get(url, headers)
+    pokedex.run_crawl()
+    assert fetched == []
+
+
+def test_crawl_retries_failed_pages(pokedex, replay):
+    #nothing answers on the stand-in, so every page fails
+    for attempt in range(pokedex.CRAWL_MAX_ATTEMPTS):
+        summary = pokedex.run_crawl(stand_in=unused_url())
+        assert summary == {pokedex.CRAWL_FAILED: len(POKEMON) + len(MISSING)}
+    pokedex.add_stand_in(replay.base_url)
+    #pages that used up their attempts are left alone until they are retried on purpose
+    assert pokedex.run_crawl() == {pokedex.CRAWL_FAILED: len(POKEMON) + len(MISSING)}
+    summary = pokedex.run_crawl(retry_failed=True)
+    assert summary == {pokedex.CRAWL_OK: len(POKEMON), pokedex.CRAWL_NOT_IN_GAME: len(MISSING)}
+
+
+def test_load_counts(pokedex, workdir):
+    cache = pokedex.open_cache()
+    for name, dex, types, stats in POKEMON:
+        cache[pokedex.SEREBII_BASE_URL + name.lower()] = pokedex.parse_pokemon_page(make_page(name, dex, types, stats)).toJson()
+    assert pokedex.load_cache_into_database() == {"inserted": len(POKEMON), "updated": 0, "skipped": 0}
+    assert pokedex.load_cache_into_database() == {"inserted": 0, "updated": 0, "skipped": len(POKEMON)}
+    name, dex, types, stats = POKEMON[0]
+    cache[pokedex.SEREBII_BASE_URL + name.lower()] = pokedex.parse_pokemon_page(make_page(name, dex, types, (1,) + stats[1:])).toJson()
+    assert pokedex.load_cache_into_database() == {"inserted": 0, "updated": 1, "skipped": len(POKEMON) - 1}
+    conn = pokedex.open_database()
+    assert conn.execute("SELECT COUNT(*) FROM Pokemon").fetchone() == (len(POKEMON),)
+    assert conn.execute("SELECT hp FROM Pokemon WHERE name = ?", (name,)).fetchone() == (1,)
+    assert conn.execute("SELECT count, total FROM Type_Stats WHERE type = 'all' AND stat = 'hp'").fetchone() == (len(POKEMON), 1 + sum(entry[3][0] for entry in POKEMON[1:]))
+    conn.close()
+
+
+def test_migrates_original_schema(pokedex, workdir):
+    #the two tables the first version of the script made, with no schema version set
+    conn = sqlite3.connect(pokedex.DATABASE_FILENAME)
+    conn.executescript('''
+        CREATE TABLE Pokemon(name TEXT PRIMARY KEY, classification TEXT NOT NULL, types TEXT NOT NULL, hp INTEGER NOT NULL,
+            attack INTEGER NOT NULL, defense INTEGER NOT NULL, special_attack INTEGER NOT NULL, special_defense INTEGER NOT NULL,
+            speed INTEGER NOT NULL);
+        CREATE TABLE Pokemon_Extra(dex TEXT PRIMARY KEY, height TEXT NOT NULL, weight TEXT NOT NULL, gender_ratio TEXT NOT NULL,
+            name TEXT NOT NULL, FOREIGN KEY (name) REFERENCES Pokemon(name));
+        INSERT INTO Pokemon VALUES ('Pikachu', 'Mouse Pokémon', 'Electric-type', 35, 55, 40, 50, 50, 90);
+        INSERT INTO Pokemon_Extra VALUES ('National: #025 Galar: #194', '1ft 04in 0.4m', '13.2lbs 6.0kg', 'Male ♂: 50% Female ♀: 50%', 'Pikachu');
+    ''')
+    conn.commit()
+    conn.close()
+    conn = pokedex.open_database()
+    assert conn.execute("PRAGMA user_version").fetchone() == (pokedex.SCHEMA_VERSION,)
+    assert conn.execute("SELECT name, speed, base_stat_total FROM Pokemon WHERE name_key = 'pikachu'").fetchone() == ("Pikachu", 90, 320)
+    assert conn.execute("SELECT dex_number, height_m, weight_kg FROM Pokemon_Extra").fetchone() == (25, 0.4, 6.0)
+    assert conn.execute("SELECT type FROM Pokemon_Type WHERE name = 'Pikachu'").fetchall() == [("electric",)]
+    assert conn.execute("SELECT game, name_key FROM Game_Pokemon").fetchall() == [(pokedex.DEFAULT_GAME, "pikachu")]
+    conn.close()
+    #opening it again finds nothing left to migrate
+    conn = pokedex.open_database()
+    assert conn.execute("SELECT COUNT(*) FROM Pokemon").fetchone() == (1,)
+    conn.close()
+
+
+def test_service_status_codes(pokedex, replay):
+    pokedex.run_crawl()
+    service = pokedex.PokedexService()
+    try:
+        def get(path):
+            status, body = asyncio.run(service.respond(path))
+            return status, json.loads(body)
+        status, body = get("/pokemon/pikachu")
+        assert status == 200 and body["name"] == "Pikachu"
+        status, body = get("/filter?stat=nonsense")
+        assert status == 400
+        status, body = get("/pokemon/pikachoo")
+        assert status == 404 and "pikachu" in body["suggestions"]
+        status, body = get("/pokemon/" + MISSING[0])
+        assert status == 404 and body["reason"] == pokedex.ABSENT_NOT_FOUND
+        assert get("/nowhere")[0] == 404
+    finally:
+        service.close()
+
+
+def test_two_games_share_records_and_diff(pokedex, replay, workdir):
+    pokedex.register_game("sv", "Scarlet and Violet", "https://serebii.net/pokedex-sv/")
+    #Charizard is faster in the second game, every other Pokemon is the same
+    changed = [(name, dex, types, stats[:5] + (105,) if name == "Charizard" else stats) for (name, dex, types, stats) in POKEMON]
+    fixture_dir = write_fixtures(str(workdir / "fixtures-sv"), "https://serebii.net/pokedex-sv/", changed)
+    pokedex.run_crawl()
+    with pokedex.ReplayServer(fixture_dir) as server:
+        pokedex.run_crawl(game="sv", stand_in=server.base_url)
+    conn = pokedex.open_database()
+    assert conn.execute("SELECT COUNT(*) FROM Pokemon").fetchone() == (len(POKEMON),)
+    storage = pokedex.game_storage(conn)
+    assert storage["games"] == {"swsh": len(POKEMON), "sv": len(POKEMON)}
+    assert storage["stat_records"] == len(POKEMON) + 1
+    assert pokedex.game_diff(conn, "charizard", "swsh", "sv") == {"speed": (100, 105), "base_stat_total": (534, 539)}
+    assert pokedex.game_changes(conn, "swsh", "sv") == ["Charizard"]
+    conn.close()
+    assert pokedex.load_cache_into_database() == {"inserted": 0, "updated": 0, "skipped": 2 * len(POKEMON)}